@@ -142,32 +142,32 @@ class AIToolMaker:
             "chatbot": {
                 "name": "AI Chatbot Assistant",
                 "description": "Professional AI chatbot with conversation history",
-                "features": ["Streaming responses", "Download conversations", "Professional persona"]
+                "features": ["Streaming responses", "Stop generation control", "Download conversations", "Professional persona"]
             },
             "blog_generator": {
                 "name": "AI Blog Writer",
                 "description": "Generate well-structured blog posts with AI",
-                "features": ["Keyword optimization", "Word count control", "Markdown export"]
+                "features": ["Keyword optimization", "Word count control", "Streaming with stop control", "Long-form mode with parallel section drafting", "Bulk generation from CSV", "Markdown export"]
             },
             "data_analyzer": {
                 "name": "CSV Data Analyzer", 
                 "description": "Ask questions about your CSV data using AI",
-                "features": ["CSV upload", "Natural language queries", "Data insights"]
+                "features": ["CSV, compressed CSV, Parquet and Feather upload", "Cached columnar ingestion", "Out-of-core mode for large files", "Automatic dtype optimization", "Natural language queries", "Data insights", "Schema and statistics profiling", "Exact answers via local pandas/SQL execution"]
             },
             "sql_generator": {
                 "name": "SQL Query Generator",
                 "description": "Generate SQL queries from natural language",
-                "features": ["Multiple SQL dialects", "Query explanations", "Expected output preview"]
+                "features": ["Multiple SQL dialects", "Streaming query generation", "Query explanations", "Expected output preview", "Sandbox execution against an uploaded SQLite database or DDL + CSVs", "Schema index that sends only the relevant tables", "Persistent answer cache with near-duplicate lookup"]
             },
             "document_summarizer": {
                 "name": "Document Summarizer",
                 "description": "Summarize PDF and Word documents using AI",
-                "features": ["PDF support", "DOCX support", "Intelligent summarization"]
+                "features": ["PDF support", "DOCX support", "Intelligent summarization", "Parallel map-reduce summarization of the whole document", "Strategy chosen by document size", "On-disk cache of extracted text, embeddings and FAISS indexes", "Batched, concurrent embedding with retries", "Structure-aware chunking with near-duplicate removal", "Offline BM25 or hybrid passage retrieval", "Flat, HNSW or IVF vector index chosen by corpus size, with optional float16/PQ compression", "Background job queue with live progress that survives page refreshes", "Pipelined batch summarization of folders, zip archives or many uploads to JSONL/CSV"]
             },
             "web_summarizer": {
                 "name": "Website Summarizer",
                 "description": "Summarize website content using AI",
-                "features": ["URL scraping", "Markdown output", "Download summaries"]
+                "features": ["URL scraping", "Markdown output", "Download summaries", "Pooled HTTP fetching with timeouts, size cap and conditional GET revalidation", "Summary cache keyed by canonical URL and page content, with TTL and hit/miss metrics", "Main-content extraction with lxml or selectolax", "Token-budgeted prompts: truncate or summarize long pages in parts"]
             }
         }
         
@@ -73,14 +73,26 @@ class ToolGenerator:
         with open(api_key_file, "w", encoding="utf-8") as f:
             f.write(api_key_content)
         
+        files = ["app.py", "api_key.py", "requirements.txt", "README.md"]
+        
         # Copy utility files if needed
-        if tool_type == "document_summarizer":
-            utils_content = get_template(tool_type, "utils")
+        utils_content = get_template(tool_type, "utils")
+        if utils_content:
             utils_file = output_path / "utils.py"
             utils_template = Template(utils_content)
             utils_rendered = utils_template.render(**template_vars)
             with open(utils_file, "w", encoding="utf-8") as f:
                 f.write(utils_rendered)
+            files.append("utils.py")
+        
+        # Copy headless batch script if the tool has one
+        batch_content = get_template(tool_type, "batch")
+        if batch_content:
+            batch_file = output_path / "batch.py"
+            batch_rendered = Template(batch_content).render(**template_vars)
+            with open(batch_file, "w", encoding="utf-8") as f:
+                f.write(batch_rendered)
+            files.append("batch.py")
         
         # Create requirements.txt
         requirements_file = output_path / "requirements.txt"
@@ -104,12 +116,7 @@ class ToolGenerator:
         return {
             "output_dir": str(output_path.absolute()),
             "app_path": str(app_file.absolute()),
-            "files": [
-                "app.py",
-                "api_key.py", 
-                "requirements.txt",
-                "README.md"
-            ]
+            "files": files
         }
     
     def generate_website(
@@ -208,23 +215,28 @@ class ToolGenerator:
     def _generate_requirements(self, tool_type: str):
         """Generate requirements.txt based on tool type."""
         base_requirements = [
-            "streamlit>=1.28.0",
+            "streamlit>=1.37.0",
             "google-generativeai>=0.3.0"
         ]
         
         tool_specific = {
-            "data_analyzer": ["pandas>=2.0.0"],
+            "data_analyzer": ["pandas>=2.0.0", "duckdb>=1.1.0", "pyarrow>=12.0.0"],
+            "sql_generator": ["numpy>=1.24.0"],
             "document_summarizer": [
                 "langchain>=0.1.0",
                 "langchain-google-genai>=0.0.6",
                 "langchain-community>=0.0.13",
                 "pypdf>=3.17.0",
                 "python-docx>=1.0.0",
-                "faiss-cpu>=1.7.4"
+                "faiss-cpu>=1.7.4",
+                "numpy>=1.24.0",
+                "scipy>=1.10.0"
             ],
             "web_summarizer": [
                 "requests>=2.31.0",
-                "beautifulsoup4>=4.12.0"
+                "beautifulsoup4>=4.12.0",
+                "brotli>=1.1.0",
+                "lxml>=4.9.0"
             ]
         }
         
@@ -236,6 +248,17 @@ class ToolGenerator:
     
     def _generate_readme(self, tool_type: str, name: str):
         """Generate README.md for Streamlit app."""
+        batch_section = ""
+        if get_template(tool_type, "batch"):
+            batch_section = """
+## Batch Mode
+
+Process many inputs without the UI:
+```bash
+python batch.py --help
+```
+Rerunning the same batch skips items that already finished.
+"""
         return f"""# {name}
 
 ## Description
@@ -256,7 +279,7 @@ Run the application:
 ```bash
 streamlit run app.py
 ```
-
+{batch_section}
 ## Features
 - Built with Streamlit
 - Powered by {self.model}
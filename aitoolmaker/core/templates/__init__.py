@@ -1,8 +1,8 @@
 from .chatbot import CHATBOT_TEMPLATE
-from .blog_generator import BLOG_GENERATOR_TEMPLATE
-from .data_analyzer import DATA_ANALYZER_TEMPLATE
-from .sql_generator import SQL_GENERATOR_TEMPLATE
-from .document_summarizer import DOCUMENT_SUMMARIZER_TEMPLATE, DOCUMENT_UTILS_TEMPLATE
+from .blog_generator import BLOG_GENERATOR_TEMPLATE, BLOG_UTILS_TEMPLATE, BLOG_BATCH_TEMPLATE
+from .data_analyzer import DATA_ANALYZER_TEMPLATE, DATA_ANALYZER_UTILS_TEMPLATE
+from .sql_generator import SQL_GENERATOR_TEMPLATE, SQL_UTILS_TEMPLATE
+from .document_summarizer import DOCUMENT_SUMMARIZER_TEMPLATE, DOCUMENT_UTILS_TEMPLATE, DOCUMENT_BATCH_TEMPLATE
 from .web_summarizer import WEB_SUMMARIZER_TEMPLATE
 from .web_templates import get_html_template, get_css_template, get_js_template
 
@@ -13,7 +13,7 @@ def get_template(tool_type: str, format_type: str = "streamlit"):
     
     Args:
         tool_type (str): Type of tool (chatbot, blog_generator, etc.)
-        format_type (str): Format type (streamlit, html, css, js, utils)
+        format_type (str): Format type (streamlit, html, css, js, utils, batch)
         
     Returns:
         str: Template content
@@ -30,9 +30,20 @@ def get_template(tool_type: str, format_type: str = "streamlit"):
         return templates.get(tool_type, "")
     
     elif format_type == "utils":
-        if tool_type == "document_summarizer":
-            return DOCUMENT_UTILS_TEMPLATE
-        return ""
+        templates = {
+            "blog_generator": BLOG_UTILS_TEMPLATE,
+            "data_analyzer": DATA_ANALYZER_UTILS_TEMPLATE,
+            "sql_generator": SQL_UTILS_TEMPLATE,
+            "document_summarizer": DOCUMENT_UTILS_TEMPLATE
+        }
+        return templates.get(tool_type, "")
+    
+    elif format_type == "batch":
+        templates = {
+            "blog_generator": BLOG_BATCH_TEMPLATE,
+            "document_summarizer": DOCUMENT_BATCH_TEMPLATE
+        }
+        return templates.get(tool_type, "")
     
     elif format_type == "html":
         return get_html_template(tool_type)
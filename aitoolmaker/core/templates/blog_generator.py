@@ -1,28 +1,123 @@
-BLOG_GENERATOR_TEMPLATE = """import streamlit as st
-import google.generativeai as genai
-from api_key import GEMINI_API_KEY
+"""
+Blog Generator templates for AIToolMaker.
+"""
 
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
+BLOG_GENERATOR_TEMPLATE = """import hashlib
+import io
+import os
+import threading
+import streamlit as st
+from utils import (
+    model,
+    close_stream,
+    build_blog_prompt,
+    plan_section_count,
+    generate_outline,
+    draft_sections,
+    stitch_sections,
+    read_batch_csv,
+    run_batch,
+    zip_outputs,
+)
 
-generation_config = {
-    'temperature': 0.9,
-    'top_p': 1,
-    'top_k': 1,
-    'max_output_tokens': 2048,
-}
+# Generation metrics (shared by every session of this app)
+@st.cache_resource
+def get_generation_metrics():
+    \"\"\"Returns process-wide counters of completed, cancelled and failed generations.\"\"\"
+    return {"lock": threading.Lock(), "completed": 0, "cancelled": 0, "failed": 0}
 
-safety_settings = [
-    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-]
+def record_generation(outcome):
+    metrics = get_generation_metrics()
+    with metrics["lock"]:
+        metrics[outcome] += 1
 
-model = genai.GenerativeModel(
-    model_name='{{ model }}',
-    generation_config=generation_config,
-    safety_settings=safety_settings
-)
+def stream_blog(blog_title, keywords, num_words, blog_placeholder):
+    \"\"\"Streams a single-call blog post into the placeholder and returns the full text.\"\"\"
+    response = model.generate_content([build_blog_prompt(blog_title, keywords, num_words)], stream=True)
+    generated_text = ""
+    try:
+        for chunk in response:
+            generated_text += chunk.text
+            blog_placeholder.markdown(generated_text + "▌")
+    except BaseException:
+        close_stream(response)
+        raise
+    blog_placeholder.markdown(generated_text)
+    return generated_text
+
+def write_long_form_blog(blog_title, keywords, num_words):
+    \"\"\"Generates an outline, drafts its sections in parallel and shows each one as it lands.\"\"\"
+    outline = generate_outline(blog_title, keywords, num_words, plan_section_count(num_words))
+    st.markdown(f"# {blog_title}")
+    section_placeholders = [st.empty() for _ in outline]
+    for heading, placeholder in zip(outline, section_placeholders):
+        placeholder.info(f"Drafting: {heading}...")
+
+    def show_section(index, text):
+        section_placeholders[index].markdown(text)
+
+    drafts = draft_sections(blog_title, keywords, outline, num_words, on_section_done=show_section)
+    return stitch_sections(blog_title, drafts)
+
+def render_batch_page(long_form):
+    \"\"\"Generates posts for every row of an uploaded CSV, resuming any earlier run of the same file.\"\"\"
+    st.subheader('Batch Generation')
+    st.write('Upload a CSV with a `title` column and optional `keywords` and `word_count` columns.')
+    csv_file = st.file_uploader('Upload a CSV of blog titles', type=['csv'])
+    col1, col2 = st.columns(2)
+    concurrency = col1.slider('Concurrent model calls', min_value=1, max_value=16, value=4)
+    tokens_per_minute = col2.number_input(
+        'Token budget per minute (0 = unlimited)', min_value=0, value=0, step=10000
+    )
+    if csv_file is None:
+        return
+
+    csv_bytes = csv_file.getvalue()
+    try:
+        rows = read_batch_csv(io.StringIO(csv_bytes.decode('utf-8-sig')))
+    except (ValueError, UnicodeDecodeError) as e:
+        st.error(f"Could not read the CSV file: {e}")
+        return
+    st.write(f"{len(rows)} posts in this batch.")
+
+    # Same CSV, same folder: rerunning after an interruption skips finished posts
+    output_dir = os.path.join('batch_output', hashlib.sha256(csv_bytes).hexdigest()[:12])
+
+    if st.button('Generate Batch'):
+        progress = st.progress(0.0, text='Starting batch...')
+        log = st.container()
+        finished = []
+
+        def show_result(row, path, status, error):
+            finished.append(row)
+            progress.progress(len(finished) / max(len(rows), 1), text=f"{len(finished)}/{len(rows)} posts")
+            if status == 'failed':
+                log.error(f"{row['title']}: {error}")
+            else:
+                log.write(f"{'✅' if status == 'done' else '⏭️'} {row['title']}")
+
+        summary = run_batch(
+            rows,
+            output_dir,
+            max_workers=concurrency,
+            tokens_per_minute=tokens_per_minute or None,
+            long_form=long_form,
+            on_result=show_result,
+        )
+        st.success(f"Done: {summary['done']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+        # Zipped once per finished batch; reruns only offer the existing file
+        if any(name.endswith('.md') for name in os.listdir(output_dir)):
+            zip_outputs(output_dir)
+
+    zip_path = output_dir + '.zip'
+    if os.path.exists(zip_path):
+        with open(zip_path, 'rb') as f:
+            st.download_button(
+                label='Download posts as ZIP',
+                data=f.read(),
+                file_name='blog_posts.zip',
+                mime='application/zip',
+            )
 
 # Page config
 st.set_page_config(layout="wide")
@@ -34,36 +129,52 @@ st.subheader('Now you can craft perfect blogs with the help of AI')
 # Sidebar configuration
 with st.sidebar:
     st.title('📋 Blog Configuration')
-    st.subheader('Enter details of the blog you want to generate')
-    
-    blog_title = st.text_input('Blog Title')
-    keywords = st.text_input('Keywords (comma-separated)')
-    num_words = st.slider('Number of words', min_value=200, max_value=2500, step=250)
-    
-    submit_button = st.button('Generate Blog')
+    mode = st.radio('Mode', ['Single post', 'Batch from CSV'], horizontal=True)
+
+    if mode == 'Single post':
+        st.subheader('Enter details of the blog you want to generate')
+
+        blog_title = st.text_input('Blog Title')
+        keywords = st.text_input('Keywords (comma-separated)')
+        num_words = st.slider('Number of words', min_value=200, max_value=2500, step=250)
+
+    long_form = st.toggle(
+        'Long-form mode',
+        help='Generate an outline first, then draft all sections in parallel. Recommended for 1000+ words.'
+    )
+
+    if mode == 'Single post':
+        submit_button = st.button('Generate Blog')
+
+    with st.expander('Generation Metrics'):
+        metrics = get_generation_metrics()
+        st.metric('Completed', metrics['completed'])
+        st.metric('Cancelled', metrics['cancelled'])
+        st.metric('Failed', metrics['failed'])
+
+if mode == 'Batch from CSV':
+    render_batch_page(long_form)
 
 # Generate blog
-if submit_button:
+elif submit_button:
     if not blog_title:
         st.warning("Please enter a blog title.")
     else:
+        # Clicking "Stop", changing a sidebar input or closing the tab makes Streamlit
+        # interrupt this script, which lands in the finally block below.
+        outcome = "cancelled"
         with st.spinner('Generating blog post...'):
             try:
-                prompt_parts = [f\"\"\"
-                Generate a well-structured and engaging blog post with the title: "{blog_title}". 
-                Incorporate the following keywords naturally throughout the content: "{keywords}". 
-                The blog post should aim for a professional yet accessible tone, suitable for a broad audience interested in this topic. 
-                Organize the blog post with clear headings and subheadings where appropriate to enhance readability. 
-                The approximate word count should be {num_words} words. 
-                Please ensure the introduction is captivating, the body paragraphs are informative and well-supported, and the conclusion provides a concise summary or call to action (if relevant to the topic).
-                \"\"\"]
-                
-                response = model.generate_content(prompt_parts)
-                generated_text = response.text
-                
                 st.subheader("Generated Blog Post:")
-                st.markdown(generated_text)
-                
+                stop_placeholder = st.empty()
+                stop_placeholder.button('⏹ Stop generating', key='stop_generation')
+                if long_form:
+                    generated_text = write_long_form_blog(blog_title, keywords, num_words)
+                else:
+                    generated_text = stream_blog(blog_title, keywords, num_words, st.empty())
+                stop_placeholder.empty()
+                outcome = "completed"
+
                 if generated_text:
                     st.download_button(
                         label="Download as Markdown",
@@ -72,5 +183,486 @@ if submit_button:
                         mime="text/markdown",
                     )
             except Exception as e:
+                outcome = "failed"
                 st.error(f"An error occurred during blog post generation: {e}")
+            finally:
+                record_generation(outcome)
+"""
+
+BLOG_UTILS_TEMPLATE = """import csv
+import hashlib
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+import google.generativeai as genai
+from api_key import GEMINI_API_KEY
+
+# Configure Gemini API
+genai.configure(api_key=GEMINI_API_KEY)
+
+generation_config = {
+    'temperature': 0.9,
+    'top_p': 1,
+    'top_k': 1,
+    'max_output_tokens': 2048,
+}
+
+safety_settings = [
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+model = genai.GenerativeModel(
+    model_name='{{ model }}',
+    generation_config=generation_config,
+    safety_settings=safety_settings
+)
+
+# Long-form mode: roughly one section per this many words, within these bounds
+WORDS_PER_SECTION = 400
+MIN_SECTIONS = 3
+MAX_SECTIONS = 8
+LIST_MARKER_PATTERN = r'^\\s*(?:#+|[-*+](?=\\s)|\\d+[.)](?=\\s))\\s*'
+
+# Batch mode: rough token cost used for rate limiting
+TOKENS_PER_WORD = 1.4
+PROMPT_OVERHEAD_TOKENS = 250
+DEFAULT_BATCH_WORDS = 1000
+
+
+def build_blog_prompt(blog_title, keywords, num_words):
+    \"\"\"
+    Builds the single-call prompt for a complete blog post.
+
+    Args:
+        blog_title (str): Title of the blog post.
+        keywords (str): Comma-separated keywords to work into the content.
+        num_words (int): Approximate target word count.
+
+    Returns:
+        str: The prompt text.
+    \"\"\"
+    return f\"\"\"
+    Generate a well-structured and engaging blog post with the title: "{blog_title}".
+    Incorporate the following keywords naturally throughout the content: "{keywords}".
+    The blog post should aim for a professional yet accessible tone, suitable for a broad audience interested in this topic.
+    Organize the blog post with clear headings and subheadings where appropriate to enhance readability.
+    The approximate word count should be {num_words} words.
+    Please ensure the introduction is captivating, the body paragraphs are informative and well-supported, and the conclusion provides a concise summary or call to action (if relevant to the topic).
+    \"\"\"
+
+
+def close_stream(response):
+    \"\"\"Cancels the upstream streaming request so the model stops producing tokens.\"\"\"
+    iterator = getattr(response, "_iterator", None)
+    for method_name in ("cancel", "close"):
+        method = getattr(iterator, method_name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception:
+                pass
+            return
+
+
+def plan_section_count(num_words):
+    \"\"\"Returns how many sections a long-form post of num_words should be split into.\"\"\"
+    return max(MIN_SECTIONS, min(MAX_SECTIONS, round(num_words / WORDS_PER_SECTION)))
+
+
+def generate_outline(blog_title, keywords, num_words, num_sections, limiter=None):
+    \"\"\"
+    Asks the model for the section headings of a long-form post.
+
+    Args:
+        blog_title (str): Title of the blog post.
+        keywords (str): Comma-separated keywords to work into the content.
+        num_words (int): Approximate target word count of the whole post.
+        num_sections (int): Number of sections to plan.
+        limiter (TokenRateLimiter): Optional shared limiter the call waits on.
+
+    Returns:
+        list: Section headings in reading order.
+    \"\"\"
+    prompt = f\"\"\"
+    Plan the outline of a blog post titled "{blog_title}" of about {num_words} words.
+    The post should naturally cover these keywords: "{keywords}".
+    Return exactly {num_sections} section headings, one per line, with no numbering, bullets or extra text.
+    The first section is the introduction and the last section is the conclusion.
+    \"\"\"
+    with model_call(limiter, PROMPT_OVERHEAD_TOKENS):
+        response = model.generate_content(prompt)
+    # Strip only list markers and bold, so headings such as "5G rollout" keep their leading digits
+    headings = [re.sub(LIST_MARKER_PATTERN, '', line).replace('**', '').strip() for line in response.text.splitlines()]
+    headings = [heading for heading in headings if heading]
+    if not headings:
+        raise ValueError("The model returned an empty outline.")
+    return headings[:num_sections]
+
+
+def draft_section(blog_title, keywords, outline, index, section_words, open_streams=None, stopped=None, limiter=None):
+    \"\"\"
+    Drafts one section of a long-form post, given the full outline for context.
+
+    The section is streamed so that an interrupted post can close the request
+    instead of paying for the rest of its output.
+
+    Args:
+        open_streams (dict): Where the live response is registered under index
+            while it streams, so the caller can close it.
+        stopped (threading.Event): Set by the caller to abandon the section.
+        limiter (TokenRateLimiter): Optional shared limiter the call waits on.
+
+    Returns:
+        str: The section in Markdown, starting with its heading.
+    \"\"\"
+    outline_text = "\\n".join(f"{i + 1}. {heading}" for i, heading in enumerate(outline))
+    prompt = f\"\"\"
+    You are writing one section of a blog post titled "{blog_title}".
+    The full outline of the post is:
+    {outline_text}
+
+    Write only section {index + 1}: "{outline[index]}", in about {section_words} words.
+    Start with the heading "## {outline[index]}" and do not write any other section.
+    Work in these keywords where they fit naturally: "{keywords}".
+    Use a professional yet accessible tone, suitable for a broad audience interested in this topic.
+    \"\"\"
+    with model_call(limiter, estimate_call_tokens(section_words)):
+        if stopped is not None and stopped.is_set():
+            return ""
+        response = model.generate_content(prompt, stream=True)
+        if open_streams is not None:
+            open_streams[index] = response
+        text = ""
+        try:
+            for chunk in response:
+                if stopped is not None and stopped.is_set():
+                    close_stream(response)
+                    break
+                text += chunk.text
+        finally:
+            if open_streams is not None:
+                open_streams.pop(index, None)
+    return text.strip()
+
+
+def draft_sections(blog_title, keywords, outline, num_words, max_workers=None, on_section_done=None,
+                   limiter=None, executor=None):
+    \"\"\"
+    Drafts all outline sections concurrently, so the post takes about as long as its slowest section.
+
+    Args:
+        blog_title (str): Title of the blog post.
+        keywords (str): Comma-separated keywords to work into the content.
+        outline (list): Section headings in reading order.
+        num_words (int): Approximate target word count of the whole post.
+        max_workers (int): Maximum concurrent model calls (default: one per section).
+        on_section_done (callable): Called as on_section_done(index, text) on the calling
+            thread as each section finishes.
+        limiter (TokenRateLimiter): Optional shared limiter every section call waits on.
+        executor (ThreadPoolExecutor): Optional shared pool to draft on instead of a pool of our
+            own, so concurrent posts together stay within its worker count. It is not shut down.
+
+    Returns:
+        list: Section drafts in outline order.
+    \"\"\"
+    section_words = max(100, num_words // len(outline))
+    drafts = [None] * len(outline)
+    open_streams = {}
+    stopped = threading.Event()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(outline))
+    futures = {
+        executor.submit(
+            draft_section, blog_title, keywords, outline, index, section_words, open_streams, stopped, limiter
+        ): index
+        for index in range(len(outline))
+    }
+    try:
+        for future in as_completed(futures):
+            index = futures[future]
+            drafts[index] = future.result()
+            if on_section_done:
+                on_section_done(index, drafts[index])
+    finally:
+        # If we were interrupted, drop queued sections and close the streams of running ones
+        stopped.set()
+        for future in futures:
+            future.cancel()
+        for response in list(open_streams.values()):
+            close_stream(response)
+        if own_executor:
+            executor.shutdown(wait=False)
+    return drafts
+
+
+def stitch_sections(blog_title, drafts):
+    \"\"\"Joins section drafts into a single Markdown post.\"\"\"
+    return f"# {blog_title}\\n\\n" + "\\n\\n".join(drafts) + "\\n"
+
+
+def generate_blog(blog_title, keywords, num_words, long_form=False, max_workers=None, limiter=None, executor=None):
+    \"\"\"
+    Generates a complete blog post without streaming, for batch use.
+
+    Args:
+        limiter (TokenRateLimiter): Optional shared limiter every model call waits on.
+        executor (ThreadPoolExecutor): Optional shared pool for long-form sections (see draft_sections).
+
+    Returns:
+        str: The blog post in Markdown.
+    \"\"\"
+    if long_form:
+        outline = generate_outline(blog_title, keywords, num_words, plan_section_count(num_words), limiter=limiter)
+        drafts = draft_sections(
+            blog_title, keywords, outline, num_words, max_workers=max_workers, limiter=limiter, executor=executor
+        )
+        return stitch_sections(blog_title, drafts)
+    with model_call(limiter, estimate_call_tokens(num_words)):
+        response = model.generate_content([build_blog_prompt(blog_title, keywords, num_words)])
+    return response.text
+
+
+class TokenRateLimiter:
+    \"\"\"
+    Blocks callers so that no more than tokens_per_minute tokens are spent in any 60-second window,
+    and, with max_concurrent, no more than that many model calls run at once.
+    \"\"\"
+
+    def __init__(self, tokens_per_minute=None, max_concurrent=None):
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._spent = deque()
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    @contextmanager
+    def call(self, tokens):
+        \"\"\"Holds a concurrency slot for the duration of one model call, after spending its tokens.\"\"\"
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            self.acquire(tokens)
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def acquire(self, tokens):
+        if not self.tokens_per_minute:
+            return
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._spent and now - self._spent[0][0] >= 60:
+                    self._spent.popleft()
+                if sum(spent for _, spent in self._spent) + tokens <= self.tokens_per_minute:
+                    self._spent.append((now, tokens))
+                    return
+                wait = 60 - (now - self._spent[0][0])
+            time.sleep(max(wait, 0.05))
+
+
+def estimate_call_tokens(num_words):
+    \"\"\"Estimates prompt plus output tokens for one model call that writes about num_words words.\"\"\"
+    return int(num_words * TOKENS_PER_WORD) + PROMPT_OVERHEAD_TOKENS
+
+
+def model_call(limiter, tokens):
+    \"\"\"Returns the limiter's slot for one model call, or a no-op context when there is no limiter.\"\"\"
+    return limiter.call(tokens) if limiter is not None else nullcontext()
+
+
+def read_batch_csv(csv_file):
+    \"\"\"
+    Reads batch rows from a CSV with a title column and optional keywords and word_count columns.
+
+    Args:
+        csv_file: A text file object or iterable of CSV lines.
+
+    Returns:
+        list: Dicts with title, keywords and num_words keys.
+    \"\"\"
+    reader = csv.DictReader(csv_file)
+    if not reader.fieldnames:
+        raise ValueError("The CSV file is empty.")
+    columns = {name.strip().lower().replace(' ', '_'): name for name in reader.fieldnames}
+    if 'title' not in columns:
+        raise ValueError("The CSV file must have a 'title' column.")
+    words_column = next((columns[name] for name in ('word_count', 'words', 'num_words') if name in columns), None)
+
+    rows = []
+    for line_number, record in enumerate(reader, start=2):
+        title = (record.get(columns['title']) or '').strip()
+        if not title:
+            continue
+        keywords = (record.get(columns['keywords']) or '').strip() if 'keywords' in columns else ''
+        words = (record.get(words_column) or '').strip() if words_column else ''
+        try:
+            num_words = int(float(words)) if words else DEFAULT_BATCH_WORDS
+        except ValueError:
+            raise ValueError(f"Line {line_number}: word count {words!r} is not a number.")
+        if num_words <= 0:
+            raise ValueError(f"Line {line_number}: word count must be positive, got {num_words}.")
+        rows.append({
+            'title': title,
+            'keywords': keywords,
+            'num_words': num_words,
+        })
+    return rows
+
+
+def batch_file_name(row):
+    \"\"\"Returns a stable Markdown file name for a batch row, so reruns can skip finished posts.\"\"\"
+    slug = re.sub(r'[^a-z0-9]+', '-', row['title'].lower()).strip('-')[:60] or 'post'
+    digest = hashlib.sha256(f"{row['title']}|{row['keywords']}|{row['num_words']}".encode('utf-8')).hexdigest()[:8]
+    return f"{slug}-{digest}.md"
+
+
+def run_batch(rows, output_dir, max_workers=4, tokens_per_minute=None, long_form=False, on_result=None):
+    \"\"\"
+    Generates blog posts for many rows concurrently and writes each one to output_dir as it completes.
+
+    Rows whose Markdown file already exists are skipped, so an interrupted batch resumes where it stopped.
+
+    Args:
+        rows (list): Rows as returned by read_batch_csv.
+        output_dir (str): Directory for the generated Markdown files.
+        max_workers (int): Maximum number of model calls at once across all posts, including the
+            sections of long-form posts.
+        tokens_per_minute (int): Optional token budget per minute across all model calls.
+        long_form (bool): Use outline plus parallel section drafting for each post.
+        on_result (callable): Called on the calling thread as on_result(row, path, status, error)
+            where status is 'done', 'skipped' or 'failed'.
+
+    Returns:
+        dict: Counts of done, skipped and failed rows.
+    \"\"\"
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = TokenRateLimiter(tokens_per_minute, max_concurrent=max_workers)
+    summary = {'done': 0, 'skipped': 0, 'failed': 0}
+
+    def report(row, path, status, error=None):
+        summary[status] += 1
+        if on_result:
+            on_result(row, path, status, error)
+
+    def generate_row(row, path):
+        text = generate_blog(
+            row['title'], row['keywords'], row['num_words'], long_form=long_form, limiter=limiter,
+            executor=section_executor
+        )
+        # Write to a temporary file first so an interrupted write never looks finished
+        tmp_path = path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    # Sections of every long-form post share one pool, so posts do not each open their own
+    section_executor = ThreadPoolExecutor(max_workers=max_workers) if long_form else None
+    futures = {}
+    try:
+        for row in rows:
+            path = os.path.join(output_dir, batch_file_name(row))
+            if os.path.exists(path):
+                report(row, path, 'skipped')
+            else:
+                futures[executor.submit(generate_row, row, path)] = (row, path)
+
+        for future in as_completed(futures):
+            row, path = futures[future]
+            error = future.exception()
+            report(row, path, 'failed' if error else 'done', error)
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+        if section_executor is not None:
+            section_executor.shutdown(wait=False)
+    return summary
+
+
+def zip_outputs(output_dir, zip_path=None):
+    \"\"\"Zips every Markdown file in output_dir and returns the zip path.\"\"\"
+    zip_path = zip_path or output_dir.rstrip(os.sep) + '.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for name in sorted(os.listdir(output_dir)):
+            if name.endswith('.md'):
+                zipf.write(os.path.join(output_dir, name), name)
+    return zip_path
+"""
+
+BLOG_BATCH_TEMPLATE = """\"\"\"
+Headless batch generation for {{ tool_name }}.
+
+Usage:
+    python batch.py titles.csv --output-dir posts --concurrency 4 --tokens-per-minute 100000 --zip
+
+The CSV needs a title column and may have keywords and word_count columns.
+Posts that already exist in the output directory are skipped, so rerunning resumes an interrupted batch.
+\"\"\"
+import argparse
+import sys
+from utils import read_batch_csv, run_batch, zip_outputs
+
+
+def positive_int(value):
+    \"\"\"argparse type for options that must be a whole number of at least 1.\"\"\"
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a whole number")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} must be at least 1")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate blog posts in bulk from a CSV file')
+    parser.add_argument('csv', help='CSV file with title, keywords and word_count columns')
+    parser.add_argument('--output-dir', default='batch_output', help='Directory for the Markdown files (default: batch_output)')
+    parser.add_argument('--concurrency', type=positive_int, default=4, help='Model calls at once across all posts (default: 4)')
+    parser.add_argument('--tokens-per-minute', type=positive_int, default=None, help='Token budget per minute across all model calls')
+    parser.add_argument('--long-form', action='store_true', help='Draft each post as an outline plus parallel sections')
+    parser.add_argument('--zip', action='store_true', help='Also write all posts to a zip file')
+    args = parser.parse_args()
+
+    try:
+        with open(args.csv, newline='', encoding='utf-8-sig') as f:
+            rows = read_batch_csv(f)
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot read {args.csv}: {e}")
+    print(f"Generating {len(rows)} posts into {args.output_dir}...")
+
+    def print_result(row, path, status, error):
+        detail = f" ({error})" if error else ""
+        print(f"[{status}] {row['title']} -> {path}{detail}")
+
+    summary = run_batch(
+        rows,
+        args.output_dir,
+        max_workers=args.concurrency,
+        tokens_per_minute=args.tokens_per_minute,
+        long_form=args.long_form,
+        on_result=print_result,
+    )
+    print(f"Done: {summary['done']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+
+    if args.zip:
+        print(f"Zip file: {zip_outputs(args.output_dir)}")
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
 """
@@ -1,4 +1,5 @@
-CHATBOT_TEMPLATE = """import streamlit as st
+CHATBOT_TEMPLATE = """import threading
+import streamlit as st
 import google.generativeai as genai
 from api_key import GEMINI_API_KEY
 
@@ -49,6 +50,36 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
+# Generation metrics (shared by every session of this app)
+@st.cache_resource
+def get_generation_metrics():
+    \"\"\"Returns process-wide counters of completed, cancelled and failed generations.\"\"\"
+    return {"lock": threading.Lock(), "completed": 0, "cancelled": 0, "failed": 0}
+
+def record_generation(outcome):
+    metrics = get_generation_metrics()
+    with metrics["lock"]:
+        metrics[outcome] += 1
+
+def close_stream(response):
+    \"\"\"Cancels the upstream streaming request so the model stops producing tokens.\"\"\"
+    iterator = getattr(response, "_iterator", None)
+    for method_name in ("cancel", "close"):
+        method = getattr(iterator, method_name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception:
+                pass
+            return
+
+with st.sidebar:
+    st.subheader("Generation Metrics")
+    metrics = get_generation_metrics()
+    st.metric("Completed", metrics["completed"])
+    st.metric("Cancelled", metrics["cancelled"])
+    st.metric("Failed", metrics["failed"])
+
 # Chat input
 user_input = st.chat_input("Ask a professional question...")
 
@@ -58,22 +89,45 @@ if user_input:
     with st.chat_message("user"):
         st.markdown(user_input)
     
-    # Generate response
+    # Generate response. Clicking "Stop", sending a new message or closing the tab
+    # makes Streamlit interrupt this script, which lands in the finally block below.
+    response_chunks = None
+    full_response = ""
+    outcome = "cancelled"
     with st.spinner("Processing request..."):
         try:
             response_chunks = st.session_state.chat_session.send_message(user_input, stream=True)
             
-            full_response = ""
             with st.chat_message("assistant"):
                 message_placeholder = st.empty()
+                stop_placeholder = st.empty()
+                stop_placeholder.button("⏹ Stop generating", key="stop_generation")
                 for chunk in response_chunks:
                     full_response += chunk.text
                     message_placeholder.markdown(full_response + "▌") 
                 message_placeholder.markdown(full_response) 
+                stop_placeholder.empty()
             
             st.session_state.messages.append({"role": "assistant", "content": full_response})
+            outcome = "completed"
         except Exception as e:
+            outcome = "failed"
             st.error(f"An error occurred: {e}. Please try again.")
+        finally:
+            if outcome != "completed":
+                close_stream(response_chunks)
+                if response_chunks is not None:
+                    # Drop the unfinished exchange so the chat session stays usable
+                    try:
+                        st.session_state.chat_session.rewind()
+                    except Exception:
+                        pass
+            if outcome == "cancelled" and full_response:
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": full_response + "\\n\\n_(generation stopped)_"
+                })
+            record_generation(outcome)
 
 # Download conversation
 def get_chat_history_as_text():
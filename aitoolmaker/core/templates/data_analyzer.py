@@ -1,69 +1,1071 @@
-"""
-Data Analyzer template for AIToolMaker.
-"""
-
-DATA_ANALYZER_TEMPLATE = """import streamlit as st
-import pandas as pd
-import google.generativeai as genai
-from api_key import GEMINI_API_KEY
-
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("{{ model }}")
-
-# Page config
-st.set_page_config(page_title="{{ tool_name }}", layout="centered")
-
-st.title("{{ tool_name }}")
-st.write("Upload your CSV and ask questions about it.")
-
-# File uploader
-uploaded_file = st.file_uploader("Upload a CSV file", type=["csv"])
-
-if uploaded_file is not None:
-    # Read CSV
-    df = pd.read_csv(uploaded_file)
-    
-    st.subheader("Data Preview")
-    st.dataframe(df.head())
-    
-    column_names = ", ".join(df.columns)
-    
-    # Initialize chat history
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    
-    # Display previous Q&A
-    if st.session_state.chat_history:
-        st.subheader("Previous Q&A")
-        for i, (q, a) in enumerate(st.session_state.chat_history):
-            st.markdown(f"**Q{i+1}:** {q}")
-            st.markdown(f"**A{i+1}:** {a}")
-            st.markdown("---")
-    
-    # Question input
-    user_query = st.text_input("Ask a question about your data")
-    
-    if user_query:
-        with st.spinner("Thinking..."):
-            csv_sample = df.to_csv(index=False)
-            
-            prompt = (
-                f"The dataset has the following columns: {column_names}.\\n"
-                f"Here are the rows:\\n{csv_sample}\\n"
-                f"Now answer this question: {user_query}"
-            )
-            
-            try:
-                response = model.generate_content(prompt)
-                answer_text = response.text
-                
-                st.subheader("Answer")
-                st.write(answer_text)
-                
-                # Save to history
-                st.session_state.chat_history.append((user_query, answer_text))
-                
-            except Exception as e:
-                st.error(f"Model error: {str(e)}")
-"""
\ No newline at end of file
+"""
+Data Analyzer templates for AIToolMaker.
+"""
+
+DATA_ANALYZER_TEMPLATE = """import os
+import streamlit as st
+import pandas as pd
+from utils import (
+    duckdb,
+    model,
+    profile_dataframe,
+    format_profile,
+    sample_rows,
+    build_question_prompt,
+    describe_schema,
+    build_code_prompt,
+    extract_code,
+    run_pandas_expression,
+    run_sql_query,
+    result_to_text,
+    build_narration_prompt,
+    file_content_hash,
+    server_file_hash,
+    list_server_files,
+    open_source,
+    load_dataset,
+    spool_upload,
+    profile_out_of_core,
+    sample_out_of_core,
+    MAX_RESULT_ROWS,
+    OUT_OF_CORE_THRESHOLD_BYTES,
+    SERVER_DATA_DIR,
+    SUPPORTED_UPLOAD_TYPES,
+)
+
+@st.cache_resource(max_entries=4)
+def load_cached_dataset(content_hash, file_name, _source):
+    \"\"\"
+    Parses an upload or server file once per content hash; every rerun and session with the same file
+    shares the result. Returns the DataFrame and its memory report.
+    \"\"\"
+    with open_source(_source) as file_obj:
+        return load_dataset(file_obj, file_name, content_hash)
+
+@st.cache_resource(max_entries=4)
+def spool_cached_upload(content_hash, file_name, _source):
+    \"\"\"Converts a large upload or server file to Parquet on disk once per content hash; returns the file path.\"\"\"
+    with open_source(_source) as file_obj:
+        return spool_upload(file_obj, file_name, content_hash)
+
+@st.cache_resource(max_entries=4)
+def load_cached_sample(content_hash, dataset_path):
+    \"\"\"Loads a bounded reservoir sample of an out-of-core dataset for previews.\"\"\"
+    return sample_out_of_core(dataset_path)
+
+@st.cache_data(max_entries=16)
+def analyze_dataset(content_hash, _df, dataset_path=None):
+    \"\"\"
+    Profiles and samples a dataset once per content hash; every question reuses the result.
+    Out-of-core datasets are profiled in DuckDB and _df is then only their reservoir sample.
+    \"\"\"
+    profile = profile_out_of_core(dataset_path) if dataset_path else profile_dataframe(_df)
+    sample = sample_rows(_df, profile=profile)
+    return {
+        "rows": profile["rows"],
+        "profile_text": format_profile(profile),
+        "schema_text": describe_schema(profile),
+        "sample_csv": sample.to_csv(index=False),
+        "sample_size": len(sample),
+    }
+
+def get_upload_hash(uploaded_file):
+    \"\"\"Hashes each upload only once per session instead of on every rerun.\"\"\"
+    if st.session_state.get("hashed_file_id") != uploaded_file.file_id:
+        st.session_state.upload_hash = file_content_hash(uploaded_file)
+        st.session_state.hashed_file_id = uploaded_file.file_id
+    return st.session_state.upload_hash
+
+# Page config
+st.set_page_config(page_title="{{ tool_name }}", layout="centered")
+
+st.title("{{ tool_name }}")
+st.write("Upload your data file and ask questions about it.")
+
+# File uploader
+uploaded_file = st.file_uploader(
+    "Upload a CSV (optionally compressed), Parquet or Feather file",
+    type=SUPPORTED_UPLOAD_TYPES
+)
+
+# Uploads are held in memory by Streamlit, so files too large for that are read from a server directory instead
+server_file = None
+if SERVER_DATA_DIR and uploaded_file is None:
+    server_files = list_server_files()
+    if server_files:
+        server_file = st.selectbox(
+            f"...or pick a file from {SERVER_DATA_DIR} on the server",
+            [None] + server_files,
+            format_func=lambda name: "(none)" if name is None else name
+        )
+
+source = None
+if uploaded_file is not None:
+    source, file_name, file_size = uploaded_file, uploaded_file.name, uploaded_file.size
+    content_hash = get_upload_hash(uploaded_file)
+elif server_file is not None:
+    source = os.path.join(SERVER_DATA_DIR, server_file)
+    file_name, file_size = server_file, os.path.getsize(source)
+    content_hash = server_file_hash(source)
+
+if source is not None:
+    # Large files never become one DataFrame: DuckDB scans them from disk and df holds only a sample
+    out_of_core = duckdb is not None and file_size > OUT_OF_CORE_THRESHOLD_BYTES
+    dataset_path = None
+    memory_report = None
+    try:
+        with st.spinner("Loading data..."):
+            if out_of_core:
+                dataset_path = spool_cached_upload(content_hash, file_name, source)
+                df = load_cached_sample(content_hash, dataset_path)
+            else:
+                df, memory_report = load_cached_dataset(content_hash, file_name, source)
+            analysis = analyze_dataset(content_hash, df, dataset_path)
+    except Exception as e:
+        st.error(f"Could not read the file: {e}")
+        st.stop()
+
+    if out_of_core:
+        st.info(
+            f"Large file: exact answers run out-of-core in DuckDB over all {analysis['rows']:,} rows; "
+            f"the preview and approximate mode use a {len(df):,}-row sample."
+        )
+
+    st.subheader("Data Preview")
+    st.dataframe(df.head())
+    # Only report a saving: on pandas 3 strings already parse to the compact dtype, so often nothing shrinks
+    if memory_report and memory_report["after_bytes"] < memory_report["before_bytes"]:
+        st.caption(
+            f"In memory: {memory_report['after_bytes'] / 1024 ** 2:,.1f} MB "
+            f"(was {memory_report['before_bytes'] / 1024 ** 2:,.1f} MB with default dtypes)"
+        )
+
+    with st.expander("Dataset Profile"):
+        st.text(analysis["profile_text"])
+
+    # Initialize chat history
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
+
+    # Display previous Q&A
+    if st.session_state.chat_history:
+        st.subheader("Previous Q&A")
+        for i, (q, a) in enumerate(st.session_state.chat_history):
+            st.markdown(f"**Q{i+1}:** {q}")
+            st.markdown(f"**A{i+1}:** {a}")
+            st.markdown("---")
+
+    # Question input
+    answer_mode = st.radio(
+        "Answer mode",
+        ["Exact (run generated code)", "Approximate (profile + sample)"],
+        horizontal=True,
+        help="Exact mode asks the model for code and runs it locally over the full dataset."
+    )
+    if answer_mode.startswith("Exact"):
+        if out_of_core:
+            languages = ["SQL (DuckDB)"]
+        else:
+            languages = ["pandas", "SQL (DuckDB)"] if duckdb is not None else ["pandas"]
+        col1, col2 = st.columns(2)
+        language = col1.selectbox("Generated code", languages)
+        narrate = col2.checkbox("Explain the result in words", value=True)
+
+    user_query = st.text_input("Ask a question about your data")
+
+    if user_query:
+        with st.spinner("Thinking..."):
+            try:
+                if answer_mode.startswith("Exact"):
+                    code_language = "sql" if language.startswith("SQL") else "pandas"
+                    code_response = model.generate_content(
+                        build_code_prompt(analysis["schema_text"], user_query, code_language)
+                    )
+                    code = extract_code(code_response.text)
+                    st.subheader("Generated Code")
+                    st.code(code, language="sql" if code_language == "sql" else "python")
+
+                    try:
+                        if code_language == "sql":
+                            if out_of_core:
+                                result = run_sql_query(code, path=dataset_path)
+                            else:
+                                result = run_sql_query(code, df=df)
+                        else:
+                            result = run_pandas_expression(code, df)
+                    except (ValueError, TimeoutError, RuntimeError):
+                        raise
+                    except Exception as e:
+                        # Errors raised by the generated code itself (bad column, type error, ...)
+                        raise ValueError(f"{type(e).__name__}: {e}") from e
+
+                    st.subheader("Result")
+                    if isinstance(result, (pd.DataFrame, pd.Series)):
+                        st.dataframe(result.head(MAX_RESULT_ROWS))
+                    else:
+                        st.write(result)
+
+                    answer_text = result_to_text(result)
+                    if narrate:
+                        narration = model.generate_content(build_narration_prompt(user_query, code, answer_text))
+                        answer_text = narration.text
+                        st.subheader("Answer")
+                        st.write(answer_text)
+                else:
+                    prompt = build_question_prompt(
+                        analysis["profile_text"],
+                        analysis["sample_csv"],
+                        analysis["sample_size"],
+                        analysis["rows"],
+                        user_query
+                    )
+                    response = model.generate_content(prompt)
+                    answer_text = response.text
+
+                    st.subheader("Answer")
+                    st.write(answer_text)
+
+                # Save to history
+                st.session_state.chat_history.append((user_query, answer_text))
+
+            except (ValueError, TimeoutError, RuntimeError) as e:
+                st.error(f"Could not run the generated code: {e}")
+            except Exception as e:
+                st.error(f"Model error: {str(e)}")
+"""
+
+DATA_ANALYZER_UTILS_TEMPLATE = """import ast
+import builtins
+import bz2
+import contextlib
+import hashlib
+import lzma
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import numpy as np
+import pandas as pd
+import google.generativeai as genai
+from api_key import GEMINI_API_KEY
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as arrow_dataset
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    arrow_dataset = None
+    feather = None
+
+# Configure Gemini API
+genai.configure(api_key=GEMINI_API_KEY)
+model = genai.GenerativeModel("{{ model }}")
+
+# Parsed datasets are shared by every session. With Copy-on-Write (always on from pandas 3.0) a shallow
+# copy cannot write through to them, and .values / .to_numpy() return read-only arrays.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Prompt sizing: the sample gets this many tokens regardless of how many rows the file has
+CHARS_PER_TOKEN = 4
+SAMPLE_TOKEN_BUDGET = 3000
+TOP_K_CATEGORIES = 5
+MAX_STRATA = 50
+MAX_CORRELATIONS = 10
+
+# Ingestion: uploads are converted once to uncompressed Feather files that are memory-mapped on later loads
+SUPPORTED_UPLOAD_TYPES = ["csv", "gz", "bz2", "zip", "xz", "zst", "parquet", "feather", "arrow"]
+CSV_COMPRESSION = {".gz": "gzip", ".bz2": "bz2", ".zip": "zip", ".xz": "xz", ".zst": "zstd"}
+CACHE_DIR = ".data_cache"
+MAX_CACHE_BYTES = 5 * 1024 ** 3
+HASH_BLOCK_SIZE = 8 * 1024 ** 2
+
+# Memory optimization after ingestion. Numeric dtypes are never narrowed: generated code may multiply
+# columns, and int32 wraps (pandas) or raises (DuckDB) where int64 does not. Categoricals save the most
+# but reject string operations such as df.region + "_x", so they are opt-in.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+USE_CATEGORIES = os.environ.get("DATA_ANALYZER_CATEGORIES", "0") == "1"
+ORIGINAL_BYTES_METADATA_KEY = b"original_memory_bytes"
+
+# Out-of-core mode: files above this size are converted to Parquet on disk and queried through DuckDB.
+# The default stays below Streamlit's 200 MB server.maxUploadSize so large uploads do switch to it.
+# Streamlit keeps an upload in memory, so only files read from SERVER_DATA_DIR never are loaded whole.
+OUT_OF_CORE_THRESHOLD_BYTES = int(os.environ.get("DATA_ANALYZER_OUT_OF_CORE_MB", "100")) * 1024 ** 2
+SERVER_DATA_DIR = os.environ.get("DATA_ANALYZER_DATA_DIR", "")
+DUCKDB_MEMORY_LIMIT = os.environ.get("DATA_ANALYZER_DUCKDB_MEMORY", "1GB")
+PREVIEW_SAMPLE_ROWS = 100_000
+MAX_CORRELATION_COLUMNS = 12
+NUMERIC_SQL_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+    "UINTEGER", "UBIGINT", "UHUGEINT", "FLOAT", "DOUBLE", "DECIMAL",
+)
+
+# Local execution of generated code
+QUERY_TIMEOUT_SECONDS = 30
+MAX_RESULT_ROWS = 1000
+SAFE_BUILTINS = {
+    "abs", "all", "any", "bool", "dict", "enumerate", "float", "int", "len", "list",
+    "max", "min", "range", "round", "set", "sorted", "str", "sum", "tuple", "zip",
+}
+# Generated pandas code may only use these attributes. Anything that takes a path (to_csv, read_*,
+# np.save, np.memmap, ...), evaluates strings (eval, query) or changes an object in place (pop,
+# insert, update, ...) is left out.
+ALLOWED_ATTRIBUTES = {
+    # DataFrame / Series / Index: selection and metadata
+    "loc", "iloc", "at", "iat", "columns", "index", "dtype", "dtypes", "shape", "size", "ndim", "empty",
+    "values", "array", "name", "names", "T", "head", "tail", "nlargest", "nsmallest", "sample", "filter",
+    "get", "isin", "between", "where", "mask", "select_dtypes", "xs", "squeeze", "item",
+    "idxmax", "idxmin", "argmax", "argmin", "first_valid_index", "last_valid_index", "keys", "items",
+    # Reshaping and cleaning (all return new objects)
+    "drop", "drop_duplicates", "duplicated", "dropna", "fillna", "ffill", "bfill", "isna", "isnull",
+    "notna", "notnull", "astype", "copy", "rename", "reset_index", "set_index", "sort_values", "sort_index",
+    "reindex", "assign", "replace", "clip", "abs", "round", "explode", "melt", "pivot", "pivot_table",
+    "stack", "unstack", "transpose", "merge", "join", "combine_first", "infer_objects", "convert_dtypes",
+    # Aggregation and statistics
+    "sum", "mean", "median", "mode", "min", "max", "std", "var", "sem", "prod", "count", "nunique",
+    "unique", "value_counts", "describe", "quantile", "corr", "cov", "skew", "kurt", "cumsum", "cumprod",
+    "cummax", "cummin", "diff", "pct_change", "shift", "rank", "any", "all", "agg", "aggregate",
+    "apply", "map", "transform", "pipe", "groupby", "first", "last", "nth", "ngroups", "groups",
+    "rolling", "expanding", "ewm", "resample", "crosstab", "memory_usage", "is_unique",
+    "is_monotonic_increasing", "is_monotonic_decreasing", "hasnans",
+    # In-memory conversions
+    "to_frame", "to_list", "tolist", "to_dict", "to_numpy", "to_period", "to_timestamp",
+    # Accessors and their common methods
+    "str", "dt", "cat", "contains", "startswith", "endswith", "lower", "upper", "title", "strip",
+    "lstrip", "rstrip", "len", "split", "extract", "slice", "zfill", "categories", "codes",
+    "year", "month", "day", "hour", "minute", "second", "weekday", "dayofweek", "day_name",
+    "month_name", "quarter", "date", "floor", "ceil", "normalize", "days", "total_seconds", "strftime",
+    # pandas functions
+    "DataFrame", "Series", "Timestamp", "Timedelta", "NA", "NaT", "Grouper", "to_datetime",
+    "to_numeric", "to_timedelta", "cut", "qcut", "concat", "date_range", "get_dummies",
+    # numpy functions and constants
+    "nan", "inf", "pi", "sqrt", "log", "log10", "log2", "log1p", "exp", "power", "sign", "isnan",
+    "isfinite", "maximum", "minimum", "percentile", "nanmean", "nanmedian", "nanstd", "nansum", "arange",
+    "linspace", "select", "digitize", "histogram", "corrcoef", "int64", "float64",
+}
+# Methods that look a string argument up as a method name, e.g. df.agg("sum")
+STRING_DISPATCH_METHODS = {"agg", "aggregate", "apply", "transform", "map", "pipe"}
+# Keywords that take the function to call, e.g. df.agg(func="sum") or df.pivot_table(aggfunc="mean")
+FUNCTION_KEYWORDS = {"func", "arg", "aggfunc"}
+DISPATCHABLE_NAMES = {
+    name for cls in (pd.DataFrame, pd.Series, pd.core.groupby.DataFrameGroupBy, pd.core.groupby.SeriesGroupBy)
+    for name in dir(cls)
+}
+
+
+def profile_dataframe(df, top_k=TOP_K_CATEGORIES):
+    \"\"\"
+    Computes a compact schema-and-statistics profile of a DataFrame using vectorized pandas operations.
+
+    Args:
+        df (pd.DataFrame): The uploaded dataset.
+        top_k (int): Number of most frequent values to keep for non-numeric columns.
+
+    Returns:
+        dict: Row count, per-column statistics and the strongest numeric correlations.
+    \"\"\"
+    null_counts = df.isna().sum()
+    unique_counts = df.nunique(dropna=True)
+    numeric = df.select_dtypes(include="number")
+    quantiles = numeric.quantile([0, 0.25, 0.5, 0.75, 1]) if not numeric.empty else None
+    means = numeric.mean() if not numeric.empty else None
+
+    columns = []
+    for name in df.columns:
+        info = {
+            "name": str(name),
+            "dtype": str(df[name].dtype),
+            "nulls": int(null_counts[name]),
+            "unique": int(unique_counts[name]),
+        }
+        if name in numeric.columns:
+            info["mean"] = float(means[name])
+            info["quantiles"] = [float(value) for value in quantiles[name]]
+        else:
+            top = df[name].value_counts(dropna=True).head(top_k)
+            info["top_values"] = [(str(value), int(count)) for value, count in top.items()]
+        columns.append(info)
+
+    correlations = []
+    if numeric.shape[1] > 1:
+        corr = numeric.corr()
+        upper = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1)).stack().dropna()
+        strongest = upper.reindex(upper.abs().sort_values(ascending=False).index).head(MAX_CORRELATIONS)
+        correlations = [(str(a), str(b), float(r)) for (a, b), r in strongest.items()]
+
+    return {"rows": len(df), "columns": columns, "correlations": correlations}
+
+
+def format_profile(profile):
+    \"\"\"Renders a profile as compact plain text for the prompt.\"\"\"
+    lines = [f"Rows: {profile['rows']}", "Columns:"]
+    for info in profile["columns"]:
+        line = f"- {info['name']} ({info['dtype']}): nulls={info['nulls']}, unique={info['unique']}"
+        if "quantiles" in info:
+            q = ", ".join(f"{value:.4g}" for value in info["quantiles"])
+            line += f", mean={info['mean']:.4g}, min/25%/50%/75%/max={q}"
+        elif info["top_values"]:
+            top = ", ".join(f"{value} ({count})" for value, count in info["top_values"])
+            line += f", top values: {top}"
+        lines.append(line)
+    if profile["correlations"]:
+        lines.append("Strongest correlations:")
+        lines.extend(f"- {a} ~ {b}: {r:.3f}" for a, b, r in profile["correlations"])
+    return "\\n".join(lines)
+
+
+def choose_strata_column(profile):
+    \"\"\"Picks the lowest-cardinality non-numeric column that is suitable for stratified sampling.\"\"\"
+    candidates = [
+        info for info in profile["columns"]
+        if "top_values" in info and 2 <= info["unique"] <= MAX_STRATA
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda info: info["unique"])["name"]
+
+
+def sample_rows(df, token_budget=SAMPLE_TOKEN_BUDGET, profile=None):
+    \"\"\"
+    Draws a row sample that fits the token budget, stratified by a categorical column when one exists.
+
+    Args:
+        df (pd.DataFrame): The uploaded dataset.
+        token_budget (int): Approximate number of prompt tokens the sample may use.
+        profile (dict): Profile from profile_dataframe, used to pick the strata column.
+
+    Returns:
+        pd.DataFrame: The sampled rows, in their original order.
+    \"\"\"
+    if df.empty:
+        return df
+    probe = df.head(20)
+    tokens_per_row = max(1.0, len(probe.to_csv(index=False)) / CHARS_PER_TOKEN / len(probe))
+    n = int(max(1, token_budget // tokens_per_row))
+    if n >= len(df):
+        return df
+
+    strata_column = choose_strata_column(profile) if profile else None
+    if strata_column is None:
+        sample = df.sample(n=n, random_state=0)
+    else:
+        column = df[strata_column]
+        # One row from every stratum first, then a proportional draw from each stratum
+        firsts = df.loc[~column.duplicated()]
+        proportional = df.groupby(column, dropna=False, observed=True).sample(frac=n / len(df), random_state=0)
+        sample = pd.concat([firsts, proportional])
+        sample = sample[~sample.index.duplicated()].head(n)
+    sample = sample.sort_index()
+
+    # Long text cells can make the estimate optimistic; shrink until the CSV fits
+    while len(sample) > 1 and len(sample.to_csv(index=False)) > token_budget * CHARS_PER_TOKEN:
+        sample = sample.iloc[: len(sample) // 2]
+    return sample
+
+
+def build_question_prompt(profile_text, sample_csv, sample_size, total_rows, question):
+    \"\"\"Builds the prompt from the profile and sample, so its size does not grow with the row count.\"\"\"
+    return (
+        "You are a data analyst. Use the profile for dataset-wide facts and the sample rows as examples only.\\n"
+        f"Dataset profile:\\n{profile_text}\\n\\n"
+        f"A stratified sample of {sample_size} of {total_rows} rows:\\n{sample_csv}\\n"
+        f"Now answer this question: {question}"
+    )
+
+
+
+def describe_schema(profile, max_examples=3):
+    \"\"\"Describes column names and types (plus a few example values for categorical columns) without any rows.\"\"\"
+    lines = [f"Rows: {profile['rows']}"]
+    for info in profile["columns"]:
+        line = f"- {info['name']} ({info['dtype']})"
+        if info.get("top_values") and info["unique"] <= MAX_STRATA:
+            examples = ", ".join(repr(value) for value, _ in info["top_values"][:max_examples])
+            line += f", e.g. {examples}"
+        lines.append(line)
+    return "\\n".join(lines)
+
+
+def build_code_prompt(schema_text, question, language):
+    \"\"\"
+    Asks the model for code that answers the question over the full dataset.
+
+    Args:
+        schema_text (str): Output of describe_schema.
+        question (str): The user's question.
+        language (str): 'pandas' for a Python expression or 'sql' for a DuckDB query.
+
+    Returns:
+        str: The prompt text.
+    \"\"\"
+    if language == "sql":
+        task = (
+            "Write a single DuckDB SQL SELECT query over the table named data that answers the question. "
+            "Quote column names with double quotes. Return only the query."
+        )
+    else:
+        task = (
+            "Write a single Python expression that answers the question using the pandas DataFrame df "
+            "(pandas is available as pd and numpy as np). Pass observed=True to groupby. "
+            "Do not use imports, assignments, statements, file access or methods that modify df. "
+            "Return only the expression."
+        )
+    return (
+        f"The dataset has this schema:\\n{schema_text}\\n\\n"
+        f"Question: {question}\\n\\n"
+        f"{task}"
+    )
+
+
+def extract_code(text):
+    \"\"\"Strips Markdown code fences and surrounding whitespace from a model reply.\"\"\"
+    match = re.search(r"```[a-zA-Z]*\\s*(.*?)```", text, re.DOTALL)
+    code = match.group(1) if match else text
+    return code.strip().rstrip(";").strip()
+
+
+def is_safe_function_argument(node):
+    \"\"\"
+    Checks a function argument of agg/apply/... so that it cannot name an arbitrary method at run time.
+
+    Accepted are a lambda, an allowed method name as a string literal, a safe builtin, a pd/np function,
+    and lists, tuples or dicts of those.
+
+    Args:
+        node (ast.AST): The argument expression.
+
+    Returns:
+        bool: Whether the argument is safe to pass as a function.
+    \"\"\"
+    if isinstance(node, ast.Lambda):
+        return True
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str) and node.value in ALLOWED_ATTRIBUTES
+    if isinstance(node, ast.Name):
+        return node.id in SAFE_BUILTINS
+    if isinstance(node, ast.Attribute):
+        return isinstance(node.value, ast.Name) and node.value.id in ("pd", "np")
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(is_safe_function_argument(element) for element in node.elts)
+    if isinstance(node, ast.Dict):
+        return all(is_safe_function_argument(value) for value in node.values)
+    return False
+
+
+def validate_pandas_expression(code, columns=()):
+    \"\"\"
+    Parses generated pandas code and rejects anything outside a read-only expression over df.
+
+    Only names in SAFE_BUILTINS and attributes in ALLOWED_ATTRIBUTES may be used, plus columns read as
+    attributes (df.price). The function passed to agg, apply and similar methods must pass
+    is_safe_function_argument, so a method name cannot be built at run time (df.agg("to_" + "csv", ...)).
+
+    Args:
+        code (str): The generated expression.
+        columns (iterable): Column names of df.
+
+    Returns:
+        code: The compiled expression.
+
+    Raises:
+        ValueError: If the code is not a single safe expression.
+    \"\"\"
+    try:
+        tree = ast.parse(code, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Generated code is not a single Python expression: {e}")
+
+    bound_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.arg):
+            bound_names.add(node.arg)
+        elif isinstance(node, ast.comprehension):
+            bound_names.update(n.id for n in ast.walk(node.target) if isinstance(n, ast.Name))
+    allowed_names = {"df", "pd", "np"} | SAFE_BUILTINS | bound_names
+    # A column shadowed by a method name is not reachable as an attribute anyway
+    column_attributes = {str(name) for name in columns} - DISPATCHABLE_NAMES
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr not in ALLOWED_ATTRIBUTES:
+            on_module = isinstance(node.value, ast.Name) and node.value.id in ("pd", "np")
+            if on_module or node.attr not in column_attributes:
+                raise ValueError(f"Access to '{node.attr}' is not allowed.")
+        if isinstance(node, ast.Name) and node.id not in allowed_names:
+            raise ValueError(f"Use of '{node.id}' is not allowed.")
+        if isinstance(node, ast.keyword) and node.arg == "inplace":
+            raise ValueError("In-place modification of the dataset is not allowed.")
+        if not isinstance(node, ast.Call):
+            continue
+        functions = [keyword.value for keyword in node.keywords if keyword.arg in FUNCTION_KEYWORDS]
+        if isinstance(node.func, ast.Attribute) and node.func.attr in STRING_DISPATCH_METHODS:
+            for keyword in node.keywords:
+                if keyword.arg is None or keyword.arg == "args":
+                    raise ValueError(f"Passing extra arguments to '{node.func.attr}' is not allowed.")
+                # Named aggregation: df.groupby("a").agg(total=("price", "sum"))
+                value = keyword.value
+                if node.func.attr in ("agg", "aggregate") and keyword.arg not in FUNCTION_KEYWORDS | {"axis"}:
+                    if isinstance(value, ast.Tuple) and len(value.elts) == 2:
+                        functions.append(value.elts[1])
+                    elif isinstance(value, (ast.Constant, ast.Lambda)):
+                        functions.append(value)
+            # A dict passed to map is a lookup table, not a function
+            if node.args and not (node.func.attr == "map" and isinstance(node.args[0], ast.Dict)):
+                functions.append(node.args[0])
+        for function in functions:
+            if not is_safe_function_argument(function):
+                raise ValueError(f"Function argument '{ast.unparse(function)}' is not allowed.")
+    return compile(tree, "<generated>", "eval")
+
+
+def validate_sql(sql):
+    \"\"\"Accepts a single read-only SELECT/WITH statement and returns it without a trailing semicolon.\"\"\"
+    statement = sql.strip().rstrip(";").strip()
+    if ";" in statement:
+        raise ValueError("Only a single SQL statement is allowed.")
+    if not re.match(r"(?is)^(select|with)\\b", statement):
+        raise ValueError("Only SELECT queries are allowed.")
+    return statement
+
+
+def run_with_timeout(fn, timeout, on_timeout=None):
+    \"\"\"
+    Runs fn on a worker thread and gives up after timeout seconds.
+
+    Python threads cannot be killed, so on_timeout should interrupt the work where the backend
+    supports it (DuckDB does); otherwise the abandoned computation finishes in the background.
+    \"\"\"
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(fn)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        if on_timeout:
+            on_timeout()
+        raise TimeoutError(f"The query did not finish within {timeout} seconds.")
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_pandas_expression(code, df, timeout=QUERY_TIMEOUT_SECONDS):
+    \"\"\"
+    Evaluates a validated pandas expression over the full DataFrame with restricted builtins.
+
+    The expression gets its own shallow copy of df, so even a change that slips past validation stays
+    within this call and never reaches the cached DataFrame other sessions use.
+    \"\"\"
+    compiled = validate_pandas_expression(code, df.columns)
+    env = {
+        "__builtins__": {name: getattr(builtins, name) for name in SAFE_BUILTINS},
+        "pd": pd,
+        "np": np,
+        "df": df.copy(deep=False),
+    }
+    return run_with_timeout(lambda: eval(compiled, env), timeout)
+
+
+def sql_literal(value):
+    \"\"\"Quotes a string as a SQL literal.\"\"\"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_identifier(name):
+    \"\"\"Quotes a column name as a SQL identifier.\"\"\"
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def connect_dataset(df=None, path=None):
+    \"\"\"
+    Opens an in-memory DuckDB connection exposing the dataset as the table data.
+
+    The connection gets a memory limit and a spill directory, then file access is disabled except for
+    the dataset file itself and the configuration is locked, so generated SQL cannot read or write files.
+
+    Args:
+        df (pd.DataFrame): An in-memory dataset, or
+        path (str): A Parquet file prepared by spool_upload.
+
+    Returns:
+        duckdb.DuckDBPyConnection: The connection.
+    \"\"\"
+    if duckdb is None:
+        raise RuntimeError("DuckDB is not installed. Install it with 'pip install duckdb' to use SQL mode.")
+    spill_dir = os.path.abspath(os.path.join(CACHE_DIR, "duckdb_tmp"))
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit = {sql_literal(DUCKDB_MEMORY_LIMIT)}")
+    con.execute(f"SET temp_directory = {sql_literal(spill_dir)}")
+    allowed_paths = []
+    if df is not None:
+        con.register("data", df)
+    else:
+        path = os.path.abspath(path)
+        con.execute(f"CREATE VIEW data AS SELECT * FROM read_parquet({sql_literal(path)})")
+        allowed_paths.append(path)
+    con.execute(f"SET allowed_paths = [{', '.join(sql_literal(p) for p in allowed_paths)}]")
+    con.execute(f"SET allowed_directories = [{sql_literal(spill_dir)}]")
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+
+def run_sql_query(sql, df=None, path=None, timeout=QUERY_TIMEOUT_SECONDS):
+    \"\"\"Runs a validated SELECT query over an in-memory DataFrame or an out-of-core Parquet file.\"\"\"
+    statement = validate_sql(sql)
+    con = connect_dataset(df=df, path=path)
+    try:
+        return run_with_timeout(lambda: con.execute(statement).fetch_df(), timeout, on_timeout=con.interrupt)
+    finally:
+        con.close()
+
+
+def result_to_text(result, max_rows=50):
+    \"\"\"Renders a query result compactly for display in history or narration prompts.\"\"\"
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        text = result.head(max_rows).to_string()
+        if len(result) > max_rows:
+            text += f"\\n... ({len(result)} rows in total)"
+        return text
+    return str(result)
+
+
+def build_narration_prompt(question, code, result_text):
+    \"\"\"Asks the model to explain an exact, locally computed result in plain language.\"\"\"
+    return (
+        f"A user asked: {question}\\n"
+        f"This code was run over the full dataset:\\n{code}\\n"
+        f"It returned:\\n{result_text}\\n\\n"
+        "Answer the question in a few sentences based only on this result."
+    )
+
+
+def file_content_hash(file_obj):
+    \"\"\"Returns the SHA-256 of a file object's content, read in blocks, and rewinds it.\"\"\"
+    file_obj.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def server_file_hash(path):
+    \"\"\"Identifies a server-side file by path, size and modification time, without reading it.\"\"\"
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def list_server_files(data_dir=SERVER_DATA_DIR):
+    \"\"\"Lists the supported data files directly inside data_dir, sorted by name.\"\"\"
+    if not data_dir or not os.path.isdir(data_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(data_dir)
+        if os.path.isfile(os.path.join(data_dir, name))
+        and os.path.splitext(name)[1].lower().lstrip(".") in SUPPORTED_UPLOAD_TYPES
+    )
+
+
+def open_source(source):
+    \"\"\"Opens a server-side path for reading, or passes an uploaded file object through unchanged.\"\"\"
+    if isinstance(source, str):
+        return open(source, "rb")
+    return contextlib.nullcontext(source)
+
+
+def detect_format(file_name):
+    \"\"\"
+    Works out how to parse an upload from its name.
+
+    Returns:
+        tuple: (format, compression) where format is 'csv', 'parquet' or 'feather'.
+    \"\"\"
+    name = file_name.lower()
+    if name.endswith(".parquet"):
+        return "parquet", None
+    if name.endswith((".feather", ".arrow")):
+        return "feather", None
+    return "csv", CSV_COMPRESSION.get(os.path.splitext(name)[1])
+
+
+def read_upload(file_obj, file_name):
+    \"\"\"Parses an uploaded CSV (plain or compressed), Parquet or Feather file into a DataFrame.\"\"\"
+    file_format, compression = detect_format(file_name)
+    file_obj.seek(0)
+    if file_format == "parquet":
+        return pd.read_parquet(file_obj)
+    if file_format == "feather":
+        return pd.read_feather(file_obj)
+    if compression is None and feather is not None:
+        # Multithreaded Arrow CSV parser
+        return pd.read_csv(file_obj, engine="pyarrow")
+    return pd.read_csv(file_obj, compression=compression)
+
+
+def prune_cache(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    \"\"\"Deletes the least recently used cache files, except keep, until the cache fits in max_bytes.\"\"\"
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            # Still memory-mapped by another session on platforms that lock mapped files
+            pass
+
+
+def nan_string_dtype():
+    \"\"\"
+    Returns the pyarrow-backed string dtype with NaN missing values, which pandas 3 uses by default.
+
+    It behaves like object strings (comparisons return numpy booleans, missing values stay NaN), unlike
+    string[pyarrow] whose pd.NA breaks boolean masks. Returns None where pandas or pyarrow lacks it.
+    \"\"\"
+    if pa is None:
+        return None
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:
+        pass
+    try:
+        # pandas 2.1 and 2.2
+        return pd.StringDtype("pyarrow_numpy")
+    except (ValueError, ImportError):
+        return None
+
+
+def optimize_dataframe_memory(df, use_categories=USE_CATEGORIES):
+    \"\"\"
+    Shrinks a DataFrame's memory footprint without changing its values or what code can do with them.
+
+    Object columns holding only strings are stored as pyarrow-backed strings with NaN missing values.
+    With use_categories, those with few distinct values become categoricals instead, which is smaller
+    but rejects string arithmetic such as df.region + "_x".
+
+    Numbers keep their dtypes: int32 overflows in products that int64 holds, and float32 sums and
+    means round differently even when every value is exact.
+
+    Args:
+        df (pd.DataFrame): A freshly parsed dataset.
+        use_categories (bool): Convert low-cardinality string columns to categoricals.
+
+    Returns:
+        tuple: (optimized DataFrame, memory in bytes before optimization)
+    \"\"\"
+    before_bytes = int(df.memory_usage(deep=True).sum())
+    df = df.copy(deep=False)
+    string_dtype = nan_string_dtype()
+
+    for name in df.columns:
+        column = df[name]
+        if column.dtype != object:
+            continue
+        # Mixed-type object columns would change values if cast, so only pure string columns qualify
+        if pd.api.types.infer_dtype(column, skipna=True) != "string":
+            continue
+        if use_categories and column.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(column):
+            df[name] = column.astype("category")
+        elif string_dtype is not None:
+            df[name] = column.astype(string_dtype)
+
+    return df, before_bytes
+
+
+def load_dataset(file_obj, file_name, content_hash, cache_dir=CACHE_DIR):
+    \"\"\"
+    Loads an upload through the on-disk columnar cache.
+
+    The first load parses the file, shrinks its dtypes with optimize_dataframe_memory and writes it as an
+    uncompressed Feather file named after its content hash. Later loads (other sessions, restarts)
+    memory-map that file instead of parsing again, and numeric columns without nulls are used without copying.
+
+    Args:
+        file_obj: The uploaded file object.
+        file_name (str): Original file name, used to detect the format.
+        content_hash (str): Hash from file_content_hash.
+        cache_dir (str): Directory for the Feather cache.
+
+    Returns:
+        tuple: (pd.DataFrame, dict with before_bytes and after_bytes memory usage)
+    \"\"\"
+    if feather is None:
+        df, before_bytes = optimize_dataframe_memory(read_upload(file_obj, file_name))
+        return df, {"before_bytes": before_bytes, "after_bytes": int(df.memory_usage(deep=True).sum())}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{content_hash}.feather")
+    if os.path.exists(cache_path):
+        os.utime(cache_path)
+    else:
+        df, before_bytes = optimize_dataframe_memory(read_upload(file_obj, file_name))
+        tmp_path = cache_path + ".part"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[ORIGINAL_BYTES_METADATA_KEY] = str(before_bytes).encode()
+            feather.write_feather(table.replace_schema_metadata(metadata), tmp_path, compression="uncompressed")
+        except Exception:
+            # Some object columns (mixed types) cannot be stored as Arrow; skip the disk cache
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return df, {"before_bytes": before_bytes, "after_bytes": int(df.memory_usage(deep=True).sum())}
+        os.replace(tmp_path, cache_path)
+        prune_cache(cache_dir, keep=cache_path)
+
+    table = feather.read_table(cache_path, memory_map=True)
+    df = table.to_pandas(split_blocks=True)
+    after_bytes = int(df.memory_usage(deep=True).sum())
+    before_bytes = int((table.schema.metadata or {}).get(ORIGINAL_BYTES_METADATA_KEY, after_bytes))
+    return df, {"before_bytes": before_bytes, "after_bytes": after_bytes}
+
+
+def open_decompressed(file_obj, file_name):
+    \"\"\"
+    Wraps an upload so it reads as plain bytes, for compressions DuckDB cannot read itself.
+
+    Returns:
+        tuple: (readable file object, extension DuckDB should see).
+    \"\"\"
+    file_format, compression = detect_format(file_name)
+    if file_format != "csv":
+        return file_obj, "." + file_format
+    if compression == "bz2":
+        return bz2.open(file_obj), ".csv"
+    if compression == "xz":
+        return lzma.open(file_obj), ".csv"
+    if compression == "zip":
+        archive = zipfile.ZipFile(file_obj)
+        return archive.open(archive.namelist()[0]), ".csv"
+    # DuckDB reads gzip and zstd directly
+    return file_obj, {"gzip": ".csv.gz", "zstd": ".csv.zst"}.get(compression, ".csv")
+
+
+def spool_upload(file_obj, file_name, content_hash, cache_dir=CACHE_DIR):
+    \"\"\"
+    Streams an upload to disk and converts it once into a Parquet file that DuckDB can scan out of core.
+
+    Conversion runs inside DuckDB under its memory limit, so it adds no memory that grows with the file
+    size. A Streamlit upload is already held in memory in full; only a file opened from SERVER_DATA_DIR
+    is streamed from disk.
+
+    Returns:
+        str: Path of the Parquet file.
+    \"\"\"
+    if duckdb is None:
+        raise RuntimeError("DuckDB is not installed. Install it with 'pip install duckdb' to use out-of-core mode.")
+    os.makedirs(cache_dir, exist_ok=True)
+    parquet_path = os.path.join(cache_dir, f"{content_hash}.parquet")
+    if os.path.exists(parquet_path):
+        os.utime(parquet_path)
+        return parquet_path
+
+    file_obj.seek(0)
+    source, extension = open_decompressed(file_obj, file_name)
+    raw_path = os.path.join(cache_dir, f"{content_hash}.upload{extension}")
+    with open(raw_path, "wb") as raw_file:
+        shutil.copyfileobj(source, raw_file, HASH_BLOCK_SIZE)
+
+    tmp_path = parquet_path + ".part"
+    con = duckdb.connect()
+    try:
+        con.execute(f"SET memory_limit = {sql_literal(DUCKDB_MEMORY_LIMIT)}")
+        con.execute(f"SET temp_directory = {sql_literal(os.path.join(cache_dir, 'duckdb_tmp'))}")
+        if extension == ".parquet":
+            scan = f"read_parquet({sql_literal(raw_path)})"
+        elif extension == ".feather":
+            con.register("upload", arrow_dataset.dataset(raw_path, format="ipc"))
+            scan = "upload"
+        else:
+            scan = f"read_csv_auto({sql_literal(raw_path)})"
+        con.execute(f"COPY (SELECT * FROM {scan}) TO {sql_literal(tmp_path)} (FORMAT parquet)")
+    finally:
+        con.close()
+        os.remove(raw_path)
+    os.replace(tmp_path, parquet_path)
+    prune_cache(cache_dir, keep=parquet_path)
+    return parquet_path
+
+
+def sql_float(value):
+    \"\"\"Converts a SUMMARIZE statistic (returned as text) to float, or NaN when missing.\"\"\"
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def profile_out_of_core(path, top_k=TOP_K_CATEGORIES):
+    \"\"\"
+    Computes the same profile as profile_dataframe for a Parquet file, using DuckDB aggregates.
+
+    Quantiles and unique counts are DuckDB's approximate values.
+
+    Returns:
+        dict: Row count, per-column statistics and the strongest numeric correlations.
+    \"\"\"
+    con = connect_dataset(path=path)
+    try:
+        rows = con.execute("SELECT count(*) FROM data").fetchone()[0]
+        summary = con.execute("SUMMARIZE data").fetchall()
+        columns = []
+        numeric_names = []
+        for name, column_type, min_value, max_value, approx_unique, avg, _std, q25, q50, q75, _count, null_pct in summary:
+            info = {
+                "name": name,
+                "dtype": column_type,
+                "nulls": int(round(rows * (null_pct or 0) / 100)),
+                "unique": int(approx_unique or 0),
+            }
+            if column_type.startswith(NUMERIC_SQL_TYPES):
+                info["mean"] = sql_float(avg)
+                info["quantiles"] = [sql_float(v) for v in (min_value, q25, q50, q75, max_value)]
+                numeric_names.append(name)
+            else:
+                column = sql_identifier(name)
+                top = con.execute(
+                    f"SELECT {column}, count(*) AS n FROM data WHERE {column} IS NOT NULL "
+                    f"GROUP BY 1 ORDER BY n DESC LIMIT {int(top_k)}"
+                ).fetchall()
+                info["top_values"] = [(str(value), int(count)) for value, count in top]
+            columns.append(info)
+
+        correlations = []
+        pairs = [
+            (a, b)
+            for i, a in enumerate(numeric_names[:MAX_CORRELATION_COLUMNS])
+            for b in numeric_names[i + 1:MAX_CORRELATION_COLUMNS]
+        ]
+        if pairs:
+            select = ", ".join(f"corr({sql_identifier(a)}, {sql_identifier(b)})" for a, b in pairs)
+            values = con.execute(f"SELECT {select} FROM data").fetchone()
+            scored = [(a, b, float(r)) for (a, b), r in zip(pairs, values) if r is not None and r == r]
+            correlations = sorted(scored, key=lambda item: abs(item[2]), reverse=True)[:MAX_CORRELATIONS]
+    finally:
+        con.close()
+    return {"rows": rows, "columns": columns, "correlations": correlations}
+
+
+def sample_out_of_core(path, rows=PREVIEW_SAMPLE_ROWS):
+    \"\"\"Draws a fixed-size reservoir sample from a Parquet file for previews and the approximate mode.\"\"\"
+    con = connect_dataset(path=path)
+    try:
+        return con.execute(f"SELECT * FROM data USING SAMPLE reservoir({int(rows)} ROWS) REPEATABLE (0)").fetch_df()
+    finally:
+        con.close()
+"""
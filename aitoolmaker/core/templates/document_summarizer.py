@@ -2,8 +2,85 @@
 Document Summarizer templates for AIToolMaker.
 """
 
-DOCUMENT_SUMMARIZER_TEMPLATE = """import streamlit as st
-from utils import summerizer
+DOCUMENT_SUMMARIZER_TEMPLATE = """import hashlib
+import os
+import time
+import streamlit as st
+from utils import (
+    JobQueue, load_document, submit_summary, get_embeddings, benchmark_indexes, upload_sources, run_document_batch,
+    DEFAULT_CONCURRENCY, STRATEGIES, RETRIEVAL_BACKENDS, RETRIEVAL_BACKEND
+)
+
+STRATEGY_LABELS = {
+    'auto': 'Automatic (by document size)',
+    'direct': 'Single call',
+    'map_reduce': 'Map-reduce',
+    'hierarchical': 'Hierarchical map-reduce',
+    'retrieval': 'Key passages only',
+}
+
+
+# Summaries run in a queue shared by every session of this app
+@st.cache_resource
+def get_job_queue():
+    \"\"\"Returns the process-wide job queue and its worker pool.\"\"\"
+    return JobQueue()
+
+
+def get_batch_hash(doc_files):
+    \"\"\"Hashes a set of uploads only once per session, keyed by their file IDs, instead of on every rerun.\"\"\"
+    file_ids = tuple(upload.file_id for upload in doc_files)
+    if st.session_state.get('batch_file_ids') != file_ids:
+        digest = hashlib.sha256()
+        for upload in doc_files:
+            digest.update(upload.name.encode('utf-8'))
+            digest.update(upload.getvalue())
+        st.session_state.batch_hash = digest.hexdigest()
+        st.session_state.batch_file_ids = file_ids
+    return st.session_state.batch_hash
+
+
+def render_batch_page(doc_files, mode, max_workers, retrieval_backend):
+    \"\"\"Summarizes every uploaded document, expanding zip archives, and resumes any earlier run of the same uploads.\"\"\"
+    output_format = st.radio('Output format', ['jsonl', 'csv'], format_func=str.upper, horizontal=True)
+    if not doc_files:
+        return
+
+    sources = list(upload_sources(doc_files))
+    st.write(f"{len(sources)} documents in this batch.")
+
+    # Same uploads and settings, same output file: rerunning after an interruption skips finished documents
+    digest = hashlib.sha256(f"{mode}|{retrieval_backend}|{get_batch_hash(doc_files)}".encode('utf-8'))
+    output_path = os.path.join('batch_output', f"{digest.hexdigest()[:12]}.{output_format}")
+
+    if st.button('Summarize All'):
+        progress = st.progress(0.0, text='Starting batch...')
+        log = st.container()
+        finished = []
+
+        def show_result(name, status, error):
+            finished.append(name)
+            progress.progress(len(finished) / max(len(sources), 1), text=f"{len(finished)}/{len(sources)} documents")
+            if status == 'failed':
+                log.error(f"{name}: {error}")
+            else:
+                log.write(f"{'Summarized' if status == 'done' else 'Already summarized'}: {name}")
+
+        summary = run_document_batch(
+            sources, output_path, mode=mode, max_workers=max_workers, retrieval_backend=retrieval_backend,
+            on_result=show_result
+        )
+        st.success(f"Done: {summary['done']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+
+    if os.path.exists(output_path):
+        with open(output_path, 'rb') as f:
+            st.download_button(
+                label=f"Download summaries as {output_format.upper()}",
+                data=f.read(),
+                file_name=f"summaries.{output_format}",
+                mime='text/csv' if output_format == 'csv' else 'application/jsonl',
+            )
+
 
 st.set_page_config(page_title='{{ tool_name }}')
 
@@ -11,102 +88,1257 @@ st.title('{{ tool_name }}')
 st.write('Summarize your PDF or Word files in just a few seconds...')
 st.divider()
 
-doc_file = st.file_uploader('Upload your PDF or Word Document...', type=['pdf', 'docx'])
-submit = st.button('Generate Summary')
+jobs = get_job_queue()
+if 'job_id' not in st.session_state:
+    # The job ID is mirrored in the URL so a refreshed page picks up its running job
+    st.session_state.job_id = st.query_params.get('job')
+job = jobs.status(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    # Fetched from another tab, or expired
+    st.session_state.job_id = None
+    st.query_params.pop('job', None)
+pending = job is not None and job['finished'] is None
+
+page = st.radio('Mode', ['Single document', 'Many documents'], horizontal=True, disabled=pending)
+if page == 'Single document':
+    doc_file = st.file_uploader('Upload your PDF or Word Document...', type=['pdf', 'docx'])
+else:
+    doc_files = st.file_uploader(
+        'Upload PDF or Word documents, or zip archives of them...', type=['pdf', 'docx', 'zip'], accept_multiple_files=True
+    )
+mode = st.selectbox('Summarization strategy', STRATEGIES, format_func=STRATEGY_LABELS.get)
+retrieval_backend = RETRIEVAL_BACKEND
+if mode == 'retrieval':
+    retrieval_backend = st.selectbox(
+        'Passage selection',
+        RETRIEVAL_BACKENDS,
+        index=RETRIEVAL_BACKENDS.index(RETRIEVAL_BACKEND),
+        format_func={'embeddings': 'Embeddings', 'bm25': 'BM25 (offline)', 'hybrid': 'Hybrid'}.get
+    )
+max_workers = st.slider('Concurrent model calls', 1, 32, DEFAULT_CONCURRENCY, disabled=mode in ('direct', 'retrieval'))
+
+if page == 'Many documents':
+    render_batch_page(doc_files, mode, max_workers, retrieval_backend)
+    st.stop()
+
+submit = st.button('Generate Summary', disabled=pending)
 
 if submit:
     if doc_file is not None:
-        with st.spinner("Generating summary... This might take a moment."):
-            response = summerizer(doc_file)
-        st.subheader('Summary of file:')
-        st.write(response)
+        st.session_state.job_id = submit_summary(
+            jobs, doc_file, mode=mode, max_workers=max_workers, retrieval_backend=retrieval_backend
+        )
+        st.query_params['job'] = st.session_state.job_id
+        st.session_state.pop('summary_job', None)
+        st.rerun()
     else:
         st.warning("Please upload a PDF or Word document first.")
+
+
+@st.fragment(run_every=1.0)
+def show_job_progress():
+    # Polls the worker without rerunning the whole page; a finished job triggers one full rerun to show it
+    job = jobs.status(st.session_state.job_id)
+    if job is None or job['finished'] is not None:
+        st.rerun()
+    if job['progress'] is None:
+        st.progress(0.0, text='Waiting for a worker...' if job['state'] == 'queued' else 'Extracting text...')
+    else:
+        stage, done, total, detail = job['progress']
+        if stage == 'embed':
+            st.progress(done / total, text=f"Embedding chunks: {done}/{total} ({detail})")
+        else:
+            label = 'Summarizing sections' if stage == 'map' else 'Combining summaries'
+            st.progress(done / total, text=f"{label}: {done}/{total}")
+    st.caption(f"Running for {time.time() - job['submitted']:.0f} s. You can leave or refresh this page.")
+    if job['partials']:
+        with st.expander('Partial summaries', expanded=False):
+            for stage, index, summary in job['partials']:
+                st.markdown(f"**{'Section' if stage == 'map' else 'Group'} {index + 1}:** {summary}")
+
+
+if pending:
+    show_job_progress()
+
+if job is not None and job['finished'] is not None:
+    st.session_state.summary_job = jobs.fetch(job['id'])
+    st.session_state.job_id = None
+    st.query_params.pop('job', None)
+
+finished = st.session_state.get('summary_job')
+if finished is not None:
+    response, info = finished['result'] or (f"ERROR: {finished['error']}", None)
+    if response.startswith("ERROR:"):
+        st.error(response)
+    else:
+        st.subheader('Summary of file:')
+        st.write(response)
+        st.caption(f"{STRATEGY_LABELS[info['strategy']]} | ~{info['tokens']:,} tokens | {info['seconds']:.1f} s")
+
+with st.expander('Vector index benchmark'):
+    st.caption(
+        "Builds flat, HNSW and IVF indexes in float32, float16 and PQ over the uploaded document's embeddings "
+        "and compares recall@10 against exact search, memory and query latency."
+    )
+    if st.button('Run benchmark'):
+        if doc_file is not None:
+            with st.spinner("Benchmarking index types..."):
+                doc_hash, text = load_document(doc_file)
+                if text.startswith("ERROR:"):
+                    st.error(text)
+                else:
+                    _, vectors = get_embeddings(text, doc_hash)
+                    st.dataframe(benchmark_indexes(vectors), hide_index=True, use_container_width=True)
+        else:
+            st.warning("Please upload a PDF or Word document first.")
 """
 
-DOCUMENT_UTILS_TEMPLATE = """from langchain.text_splitter import CharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI
+DOCUMENT_UTILS_TEMPLATE = """from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.chains.question_answering import load_qa_chain
 from pypdf import PdfReader, errors as pypdf_errors
 from docx import Document
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document as LangchainDocument
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import faiss
+import numpy as np
+from scipy import sparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import mmap
 import os
+import queue
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter, deque
 from api_key import GEMINI_API_KEY
 
 os.environ['GOOGLE_API_KEY'] = GEMINI_API_KEY
 
-def process_text(text):
+# Retrieval chunking and embeddings
+CHUNK_TOKENS = 250
+EMBEDDING_MODEL = "models/embedding-001"
+EMBED_BATCH_SIZE = 100
+EMBED_CONCURRENCY = int(os.environ.get("DOCUMENT_SUMMARIZER_EMBED_CONCURRENCY", "4"))
+EMBED_REQUESTS_PER_MINUTE = int(os.environ.get("DOCUMENT_SUMMARIZER_EMBED_RPM", "0")) or None
+EMBED_MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+TRANSIENT_ERROR_MARKERS = ('429', '500', '503', 'RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE', 'quota', 'rate limit', 'timed out')
+
+# Structure-aware chunking and near-duplicate removal
+HEADING_MAX_WORDS = 12
+HEADING_RE = re.compile(r'(chapter|section|part|article|appendix)\\b|\\d+(\\.\\d+)*\\.?\\s+\\S', re.IGNORECASE)
+PAGE_NUMBER_RE = re.compile(r'^(page\\s+)?\\d+(\\s*(of|/)\\s*\\d+)?$', re.IGNORECASE)
+BOILERPLATE_MIN_REPEATS = 5
+SIMHASH_MAX_DISTANCE = 3
+DEDUP_MIN_JACCARD = 0.9
+
+# Text extraction
+SPOOL_BLOCK_SIZE = 1024 * 1024
+PAGES_PER_TASK = 25
+PARALLEL_MIN_PAGES = 50
+EXTRACT_WORKERS = os.cpu_count() or 1
+
+# Retrieval backends: 'embeddings' (FAISS), 'bm25' (local, no network) or 'hybrid'
+RETRIEVAL_BACKENDS = ['embeddings', 'bm25', 'hybrid']
+RETRIEVAL_BACKEND = os.environ.get("DOCUMENT_SUMMARIZER_RETRIEVAL", "embeddings")
+RETRIEVAL_TOP_K = 4
+HYBRID_ALPHA = 0.5
+HYBRID_CANDIDATES = 50
+BM25_K1 = 1.5
+BM25_B = 0.75
+SUMMARY_KEYWORDS = 20
+
+# Vector index: 'auto' picks flat, HNSW or IVF by corpus size; vectors stay float32 unless compressed
+INDEX_TYPES = ['auto', 'flat', 'hnsw', 'ivf']
+INDEX_TYPE = os.environ.get("DOCUMENT_SUMMARIZER_INDEX", "auto")
+INDEX_ENCODINGS = ['float32', 'float16', 'pq']
+INDEX_ENCODING = os.environ.get("DOCUMENT_SUMMARIZER_INDEX_ENCODING", "float32")
+FLAT_MAX_VECTORS = 10000
+HNSW_MAX_VECTORS = 200000
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+IVF_MIN_POINTS_PER_LIST = 39
+PQ_SUBQUANTIZERS = 64
+PQ_MIN_VECTORS = 256 * IVF_MIN_POINTS_PER_LIST
+INDEX_TRAIN_SIZE = 100000
+
+# On-disk cache of extracted text, chunk embeddings and FAISS indexes
+DOC_CACHE_DIR = ".doc_cache"
+MAX_DOC_CACHE_BYTES = int(os.environ.get("DOCUMENT_SUMMARIZER_CACHE_MB", "500")) * 1024 ** 2
+
+# Map-reduce summarization
+MAP_CHUNK_TOKENS = 3000
+REDUCE_GROUP_SIZE = 8
+DEFAULT_CONCURRENCY = 8
+SUMMARY_QUERY = 'summarize the content of the uploaded document in approximately 3-5 sentences'
+
+# Background jobs: a process-wide worker pool shared by all sessions
+JOB_WORKERS = int(os.environ.get("DOCUMENT_SUMMARIZER_JOB_WORKERS", "2"))
+JOB_RESULT_TTL = int(os.environ.get("DOCUMENT_SUMMARIZER_JOB_TTL", "3600"))
+
+# Batch pipeline: worker threads per stage, joined by bounded queues
+BATCH_EXTENSIONS = ('.pdf', '.docx')
+BATCH_EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+BATCH_PREPARE_WORKERS = 2
+BATCH_SUMMARY_WORKERS = 4
+BATCH_QUEUE_SIZE = 8
+BATCH_FIELDS = ['name', 'sha256', 'strategy', 'tokens', 'seconds', 'summary', 'error']
+
+# Strategy selection by estimated document size
+CHARS_PER_TOKEN = 4
+DIRECT_MAX_TOKENS = int(os.environ.get("DOCUMENT_SUMMARIZER_DIRECT_TOKENS", "30000"))
+MAP_REDUCE_MAX_TOKENS = int(os.environ.get("DOCUMENT_SUMMARIZER_MAP_REDUCE_TOKENS", "250000"))
+STRATEGIES = ['auto', 'direct', 'map_reduce', 'hierarchical', 'retrieval']
+
+logger = logging.getLogger("summarizer")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+def file_content_hash(data):
+    \"\"\"Returns the SHA-256 hex digest of an uploaded file's bytes.\"\"\"
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunking_key():
+    \"\"\"Identifies the chunking and embedding parameters, so changing them never reuses old embeddings.\"\"\"
+    params = f"{CHUNK_TOKENS}:{BOILERPLATE_MIN_REPEATS}:{SIMHASH_MAX_DISTANCE}:{DEDUP_MIN_JACCARD}:{EMBEDDING_MODEL}"
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()[:16]
+
+
+def write_atomic(path, write):
+    \"\"\"
+    Calls write(tmp_path) and then moves the file into place, so readers never see a partial file.
+
+    The temporary name is unique, so concurrent writers of the same path (the same document in two
+    jobs, or duplicate files in one batch) each replace it with a complete file instead of racing.
+    \"\"\"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.part')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def directory_size(path):
+    \"\"\"Total size in bytes of the files under path.\"\"\"
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def prune_cache(cache_dir=DOC_CACHE_DIR, max_bytes=MAX_DOC_CACHE_BYTES, keep=None):
+    \"\"\"Deletes the least recently used document directories, except keep, until the cache fits in max_bytes.\"\"\"
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path):
+            entries.append((os.stat(path).st_mtime, directory_size(path), name, path))
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, name, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        # Another session may still have the index memory-mapped on platforms that lock mapped files
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def spool_upload(doc_file):
+    \"\"\"
+    Copies an upload to a temporary file in fixed-size blocks, hashing it on the way.
+
+    Args:
+        doc_file: The uploaded document file object (PDF or DOCX).
+
+    Returns:
+        tuple: (temporary file path, SHA-256 hex digest); the caller removes the file.
+    \"\"\"
+    digest = hashlib.sha256()
+    doc_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(doc_file.name)[1].lower(), delete=False) as tmp:
+        for block in iter(lambda: doc_file.read(SPOOL_BLOCK_SIZE), b''):
+            digest.update(block)
+            tmp.write(block)
+    doc_file.seek(0)
+    return tmp.name, digest.hexdigest()
+
+
+def load_document(doc_file):
+    \"\"\"
+    Extracts text from an upload, reusing the cached text when the same file was seen before.
+
+    Args:
+        doc_file: The uploaded document file object (PDF or DOCX).
+
+    Returns:
+        tuple: (file content hash, extracted text or a message starting with "ERROR:")
+    \"\"\"
+    path, doc_hash = spool_upload(doc_file)
+    return doc_hash, read_document(path, doc_hash)
+
+
+def read_document(path, doc_hash):
+    \"\"\"
+    Extracts text from a spooled upload, or reads the cached text of the same file, and removes the spool file.
+
+    Args:
+        path (str): Spooled file path from spool_upload.
+        doc_hash (str): Content hash of the file.
+
+    Returns:
+        str: Extracted text or a message starting with "ERROR:".
+    \"\"\"
+    try:
+        doc_dir = os.path.join(DOC_CACHE_DIR, doc_hash)
+        text_path = os.path.join(doc_dir, 'text.txt')
+        if os.path.exists(text_path):
+            # Directory mtime is the LRU clock
+            os.utime(doc_dir)
+            with open(text_path, encoding='utf-8') as f:
+                return f.read()
+
+        text = extract_text(path)
+    finally:
+        os.remove(path)
+
+    if not text.startswith("ERROR:"):
+        os.makedirs(doc_dir, exist_ok=True)
+
+        def write_text(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+
+        write_atomic(text_path, write_text)
+        prune_cache(keep=doc_hash)
+    return text
+
+
+class RequestRateLimiter:
+    \"\"\"Blocks callers so that no more than requests_per_minute requests start in any 60-second window.\"\"\"
+
+    def __init__(self, requests_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._started = deque()
+
+    def acquire(self):
+        if not self.requests_per_minute:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._started and now - self._started[0] >= 60:
+                    self._started.popleft()
+                if len(self._started) < self.requests_per_minute:
+                    self._started.append(now)
+                    return
+                wait = 60 - (now - self._started[0])
+            time.sleep(max(wait, 0.05))
+
+
+def is_transient_error(error):
+    \"\"\"True for rate-limit, overload and timeout errors that are worth retrying.\"\"\"
+    message = f"{type(error).__name__} {error}"
+    return any(marker.lower() in message.lower() for marker in TRANSIENT_ERROR_MARKERS) or type(error).__name__ in (
+        'ResourceExhausted', 'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded', 'TooManyRequests'
+    )
+
+
+def call_with_retries(func, max_retries=EMBED_MAX_RETRIES):
+    \"\"\"
+    Calls func, retrying transient errors with exponential backoff and full jitter.
+
+    The random delay keeps concurrent workers that hit the same 429 from retrying in lockstep.
+    \"\"\"
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == max_retries or not is_transient_error(e):
+                raise
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+
+def embed_chunks(chunks, embeddings, batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_CONCURRENCY,
+                 requests_per_minute=EMBED_REQUESTS_PER_MINUTE, on_progress=None):
+    \"\"\"
+    Embeds chunks in provider-sized batches, several batches at a time.
+
+    Each batch is one request: at most max_workers are in flight, at most requests_per_minute start per
+    minute, and a batch that fails transiently is retried on its own instead of failing the whole job.
+
+    Args:
+        chunks (list): Texts to embed.
+        embeddings: A langchain embeddings object.
+        batch_size (int): Texts per request (the provider's maximum).
+        max_workers (int): Maximum concurrent requests.
+        requests_per_minute (int): Optional request budget per minute.
+        on_progress (callable): Called on the calling thread as on_progress('embed', done, total, rate)
+            where rate describes the throughput so far.
+
+    Returns:
+        numpy.ndarray: One float32 row per chunk.
+    \"\"\"
+    limiter = RequestRateLimiter(requests_per_minute)
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+    def embed_batch(batch):
+        def request():
+            limiter.acquire()
+            return embeddings.embed_documents(batch)
+        return call_with_retries(request)
+
+    start = time.perf_counter()
+    done = 0
+
+    def report(index, vectors):
+        nonlocal done
+        done += len(batches[index])
+        if on_progress:
+            rate = done / max(time.perf_counter() - start, 1e-6)
+            on_progress('embed', done, len(chunks), f"{rate:.1f} chunks/s")
+
+    results = run_concurrently(embed_batch, batches, max_workers, report)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "embedded %d chunks in %d batches in %.2fs (%.1f chunks/s)",
+        len(chunks), len(batches), elapsed, len(chunks) / max(elapsed, 1e-6)
+    )
+    return np.asarray([vector for batch in results for vector in batch], dtype=np.float32)
+
+
+def build_vector_store(index, chunks, embeddings):
+    \"\"\"Wraps a raw FAISS index and its chunks in a langchain vector store.\"\"\"
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({str(i): LangchainDocument(page_content=chunk) for i, chunk in enumerate(chunks)}),
+        index_to_docstore_id={i: str(i) for i in range(len(chunks))}
+    )
+
+
+def read_index(path):
+    \"\"\"Opens a saved FAISS index memory-mapped, so its vectors are paged in from disk on demand.\"\"\"
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | getattr(faiss, 'IO_FLAG_READ_ONLY', 0))
+    except RuntimeError:
+        # Index types without mmap support are read normally
+        return faiss.read_index(path)
+
+
+def resolve_index_kind(num_vectors, index_type=INDEX_TYPE, encoding=INDEX_ENCODING):
+    \"\"\"
+    Turns the configured index type and encoding into the concrete pair used for a corpus.
+
+    'auto' keeps exact flat search for small corpora, where it is fast enough, moves to HNSW and then
+    to IVF as the corpus grows. Product quantization needs thousands of training vectors, so smaller
+    corpora fall back to float16.
+
+    Returns:
+        tuple: (index_type, encoding), e.g. ('hnsw', 'float16').
+    \"\"\"
+    if index_type == 'auto':
+        if num_vectors <= FLAT_MAX_VECTORS:
+            index_type = 'flat'
+        elif num_vectors <= HNSW_MAX_VECTORS:
+            index_type = 'hnsw'
+        else:
+            index_type = 'ivf'
+    if encoding == 'pq' and num_vectors < PQ_MIN_VECTORS:
+        encoding = 'float16'
+    return index_type, encoding
+
+
+def index_spec(num_vectors, dimension, index_type, encoding):
+    \"\"\"FAISS index_factory string for a resolved index type and encoding.\"\"\"
+    # Subquantizers must divide the dimension
+    subquantizers = max(m for m in range(1, PQ_SUBQUANTIZERS + 1) if dimension % m == 0)
+    storage = {'float32': 'Flat', 'float16': 'SQfp16', 'pq': f"PQ{subquantizers}"}[encoding]
+    if index_type == 'hnsw':
+        return f"HNSW{HNSW_M}" if encoding == 'float32' else f"HNSW{HNSW_M}_{storage}"
+    if index_type == 'ivf':
+        lists = max(1, min(int(4 * num_vectors ** 0.5), num_vectors // IVF_MIN_POINTS_PER_LIST))
+        return f"IVF{lists},{storage}"
+    return storage
+
+
+def tune_index(index):
+    \"\"\"Sets the search-time accuracy knobs of approximate indexes; flat indexes are left as they are.\"\"\"
+    if 'HNSW' in type(index).__name__:
+        faiss.downcast_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif 'IVF' in type(index).__name__:
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+    return index
+
+
+def build_index(vectors, index_type=INDEX_TYPE, encoding=INDEX_ENCODING):
+    \"\"\"
+    Builds a FAISS index over vectors, trained on a sample when the index type needs training.
+
+    Args:
+        vectors (numpy.ndarray): float32 embeddings, one row per chunk.
+        index_type (str): One of INDEX_TYPES.
+        encoding (str): One of INDEX_ENCODINGS.
+
+    Returns:
+        faiss.Index: The populated index, with search parameters set.
+    \"\"\"
+    start = time.perf_counter()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    spec = index_spec(len(vectors), vectors.shape[1], *resolve_index_kind(len(vectors), index_type, encoding))
+    index = faiss.index_factory(vectors.shape[1], spec)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > INDEX_TRAIN_SIZE:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), INDEX_TRAIN_SIZE, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    logger.info("built %s index over %d vectors in %.2fs", spec, len(vectors), time.perf_counter() - start)
+    return tune_index(index)
+
+
+def index_filename(num_vectors, index_type=INDEX_TYPE, encoding=INDEX_ENCODING):
+    \"\"\"Cache file name of an index, so each index kind built for a document is kept separately.\"\"\"
+    return "index-{}-{}.faiss".format(*resolve_index_kind(num_vectors, index_type, encoding))
+
+
+def benchmark_indexes(vectors, kinds=None, k=10, num_queries=200):
+    \"\"\"
+    Compares index kinds on the same vectors against exact search.
+
+    Queries are corpus vectors with a little noise added, so each has a known neighbourhood. Memory is
+    the serialized index size, which tracks the resident size closely for these index types.
+
+    Args:
+        vectors (numpy.ndarray): float32 embeddings.
+        kinds (list): (index_type, encoding) pairs; defaults to every type with every encoding.
+        k (int): Neighbours per query for recall@k.
+        num_queries (int): Number of queries to time.
+
+    Returns:
+        list: One dict per index with its spec, recall@k, memory in MB, build time and query latency.
+    \"\"\"
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)]
+    queries = queries + rng.normal(0, 0.01, queries.shape).astype(np.float32)
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    truth = exact.search(queries, k)[1]
+
+    results, seen = [], set()
+    for index_type, encoding in kinds or [(t, e) for t in INDEX_TYPES[1:] for e in INDEX_ENCODINGS]:
+        # Small corpora resolve several kinds to the same index (PQ falls back to float16)
+        kind = resolve_index_kind(len(vectors), index_type, encoding)
+        if kind in seen:
+            continue
+        seen.add(kind)
+        start = time.perf_counter()
+        index = build_index(vectors, index_type, encoding)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        found = index.search(queries, k)[1]
+        latency = (time.perf_counter() - start) / len(queries)
+        recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)])
+        results.append({
+            'index': index_spec(len(vectors), vectors.shape[1], *kind),
+            f"recall@{k}": round(float(recall), 3),
+            'memory_mb': round(faiss.serialize_index(index).nbytes / 1024 ** 2, 2),
+            'build_s': round(build_seconds, 2),
+            'query_ms': round(latency * 1000, 3),
+        })
+    return results
+
+
+def is_heading(line):
+    \"\"\"Recognizes Markdown-style, numbered, Chapter/Section and all-caps heading lines.\"\"\"
+    if line.startswith('#'):
+        return bool(re.match(r'#{1,6}\\s', line))
+    words = line.split()
+    if not words or len(words) > HEADING_MAX_WORDS or line[-1] in '.,;:':
+        return False
+    return bool(HEADING_RE.match(line)) or (line.isupper() and any(c.isalpha() for c in line))
+
+
+def remove_boilerplate(lines):
+    \"\"\"
+    Drops page-number lines and keeps only the first copy of lines that repeat on many pages,
+    such as running headers and footers.
+
+    Returns:
+        tuple: (remaining lines, set of repeated lines)
+    \"\"\"
+    counts = Counter(lines)
+    repeated = {line for line, count in counts.items() if count >= BOILERPLATE_MIN_REPEATS}
+    seen = set()
+    kept = []
+    for line in lines:
+        if PAGE_NUMBER_RE.match(line) or line in seen:
+            continue
+        if line in repeated:
+            seen.add(line)
+        kept.append(line)
+    return kept, repeated
+
+
+def split_long_unit(unit, max_tokens):
+    \"\"\"Splits a paragraph longer than max_tokens at sentence ends, then at word boundaries.\"\"\"
+    pieces, current = [], ''
+    for sentence in re.split(r'(?<=[.!?])\\s+', unit):
+        while estimate_tokens(sentence) > max_tokens:
+            cut = sentence.rfind(' ', 0, max_tokens * CHARS_PER_TOKEN)
+            cut = cut if cut > 0 else max_tokens * CHARS_PER_TOKEN
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and estimate_tokens(current + ' ' + sentence) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_document(text, max_tokens):
+    \"\"\"
+    Splits text into chunks of at most about max_tokens tokens along its structure, without overlap.
+
+    Chunks never cross a heading, break between lines (preferably after a sentence end) rather than
+    inside them, and carry the current heading when they continue a section, so no overlap is
+    needed to keep context.
+
+    Args:
+        text (str): Extracted document text.
+        max_tokens (int): Token budget per chunk.
+
+    Returns:
+        list: Chunk texts in document order.
+    \"\"\"
+    lines, repeated = remove_boilerplate([line.strip() for line in text.splitlines() if line.strip()])
+    chunks, current, heading = [], [], ''
+
+    def flush(units):
+        if units:
+            body = '\\n'.join(units)
+            chunks.append(body if not heading or units[0] == heading else f"{heading}\\n{body}")
+
+    for line in lines:
+        # A running header looks like a heading but must not label every chunk after it
+        if is_heading(line) and line not in repeated:
+            flush(current)
+            current, heading = [line], line
+            continue
+        for unit in split_long_unit(line, max_tokens) if estimate_tokens(line) > max_tokens else [line]:
+            if current and estimate_tokens('\\n'.join(current + [unit])) > max_tokens:
+                # Prefer to cut after the last complete sentence when it is in the second half
+                cut = max(
+                    (i + 1 for i, u in enumerate(current) if u[-1] in '.!?:;'),
+                    default=len(current)
+                )
+                if cut <= len(current) // 2:
+                    cut = len(current)
+                flush(current[:cut])
+                current = current[cut:]
+                if current and estimate_tokens('\\n'.join(current + [unit])) > max_tokens:
+                    flush(current)
+                    current = []
+            current.append(unit)
+    flush(current)
+    return chunks
+
+
+def shingle_hashes(text):
+    \"\"\"64-bit hashes of the distinct word 3-grams of text.\"\"\"
+    words = re.findall(r'\\w+', text.lower())
+    shingles = {' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little') for shingle in shingles],
+        dtype=np.uint64
+    )
+
+
+def simhash(hashes):
+    \"\"\"64-bit SimHash of a chunk's shingle hashes; near-identical texts get fingerprints a few bits apart.\"\"\"
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    majority = bits.sum(axis=0) * 2 > len(hashes)
+    return int(np.packbits(majority, bitorder='little').view('<u8')[0])
+
+
+def deduplicate_chunks(chunks, max_distance=SIMHASH_MAX_DISTANCE, min_jaccard=DEDUP_MIN_JACCARD):
+    \"\"\"
+    Drops chunks that nearly repeat an earlier chunk.
+
+    SimHash fingerprints are bucketed by four 16-bit bands; two fingerprints at most three bits apart
+    share at least one band, so each chunk is compared only with the few chunks in its buckets.
+    A fingerprint match is confirmed by the exact shingle overlap, so templated passages that differ
+    only in names or figures are kept.
+
+    Returns:
+        list: The first copy of every distinct chunk, in document order.
+    \"\"\"
+    bands = [{} for _ in range(4)]
+    fingerprints, shingle_sets, kept = [], [], []
+    for chunk in chunks:
+        hashes = shingle_hashes(chunk)
+        fingerprint = simhash(hashes)
+        shingles = set(hashes.tolist())
+        keys = [(fingerprint >> (16 * band)) & 0xFFFF for band in range(4)]
+        candidates = {i for band, key in enumerate(keys) for i in bands[band].get(key, ())}
+        if any(
+            bin(fingerprint ^ fingerprints[i]).count('1') <= max_distance
+            and len(shingles & shingle_sets[i]) >= min_jaccard * len(shingles | shingle_sets[i])
+            for i in candidates
+        ):
+            continue
+        for band, key in enumerate(keys):
+            bands[band].setdefault(key, []).append(len(fingerprints))
+        fingerprints.append(fingerprint)
+        shingle_sets.append(shingles)
+        kept.append(chunk)
+    return kept
+
+
+def prepare_chunks(text, max_tokens):
+    \"\"\"Chunks text along its structure and removes near-duplicate chunks, logging how many were dropped.\"\"\"
+    chunks = chunk_document(text, max_tokens)
+    unique = deduplicate_chunks(chunks)
+    if len(unique) < len(chunks):
+        logger.info("dropped %d near-duplicate chunks of %d", len(chunks) - len(unique), len(chunks))
+    return unique
+
+
+def get_chunks(text, doc_hash=None):
+    \"\"\"Returns the retrieval chunks of a document, from its cache directory when they were saved before.\"\"\"
+    index_dir = os.path.join(DOC_CACHE_DIR, doc_hash or '', chunking_key())
+    chunks_path = os.path.join(index_dir, 'chunks.json')
+    if doc_hash and os.path.exists(chunks_path):
+        os.utime(os.path.join(DOC_CACHE_DIR, doc_hash))
+        with open(chunks_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    chunks = prepare_chunks(text, CHUNK_TOKENS)
+    if doc_hash:
+        os.makedirs(index_dir, exist_ok=True)
+
+        def write_chunks(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(chunks, f)
+
+        write_atomic(chunks_path, write_chunks)
+        prune_cache(keep=doc_hash)
+    return chunks
+
+
+def get_embeddings(text, doc_hash=None, on_progress=None):
+    \"\"\"
+    Returns the chunks of a document and their embeddings, from its cache directory when saved before.
+
+    Returns:
+        tuple: (chunks, vectors) with one float32 row per chunk.
+    \"\"\"
+    chunks = get_chunks(text, doc_hash)
+    vectors_path = os.path.join(DOC_CACHE_DIR, doc_hash or '', chunking_key(), 'embeddings.npy')
+    if doc_hash and os.path.exists(vectors_path):
+        return chunks, np.load(vectors_path, mmap_mode='r')
+
+    vectors = embed_chunks(chunks, GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL), on_progress=on_progress)
+    if doc_hash:
+        def write_vectors(path):
+            with open(path, 'wb') as f:
+                np.save(f, vectors)
+
+        write_atomic(vectors_path, write_vectors)
+        prune_cache(keep=doc_hash)
+    return chunks, vectors
+
+
+def process_text(text, doc_hash=None, on_progress=None):
     \"\"\"
     Processes the input text by splitting it into chunks and creating a FAISS knowledge base.
 
+    With a doc_hash, the chunks, their embeddings and the index are saved under the document's cache
+    directory and a repeat upload loads them memory-mapped without calling the embedding API. The
+    index kind follows INDEX_TYPE and INDEX_ENCODING; changing them rebuilds the index from the
+    saved embeddings.
+
     Args:
         text (str): The raw text extracted from the PDF or Word document.
+        doc_hash (str): Optional content hash of the uploaded file.
+        on_progress (callable): Receives embedding progress (see embed_chunks).
 
     Returns:
         FAISS: A FAISS vector store containing the text chunks and their embeddings.
     \"\"\"
-    text_splitter = CharacterTextSplitter(
-        separator="\\n",
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(text)
+    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    chunks = get_chunks(text, doc_hash)
+    index_path = os.path.join(DOC_CACHE_DIR, doc_hash or '', chunking_key(), index_filename(len(chunks)))
+    if doc_hash and os.path.exists(index_path):
+        return build_vector_store(tune_index(read_index(index_path)), chunks, embeddings)
 
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    chunks, vectors = get_embeddings(text, doc_hash, on_progress)
+    index = build_index(vectors)
+    if doc_hash:
+        write_atomic(index_path, lambda path: faiss.write_index(index, path))
+        prune_cache(keep=doc_hash)
 
-    KnowledgeBase = FAISS.from_texts(chunks, embeddings)
+    KnowledgeBase = build_vector_store(index, chunks, embeddings)
     return KnowledgeBase
 
-def extract_text_from_pdf(pdf_file):
+
+def tokenize_terms(text):
+    \"\"\"Lowercase word terms of at least two characters, for lexical retrieval.\"\"\"
+    return re.findall(r'[a-z0-9]{2,}', text.lower())
+
+
+class BM25Index:
+    \"\"\"
+    Okapi BM25 over chunks, held as a sparse chunk-by-term weight matrix.
+
+    Building it is a single pass over the text with no network calls, and scoring a query is one
+    sparse column sum.
+    \"\"\"
+
+    def __init__(self, chunks, k1=BM25_K1, b=BM25_B):
+        self.vocabulary = {}
+        rows, cols = [], []
+        for row, chunk in enumerate(chunks):
+            for term in tokenize_terms(chunk):
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+        shape = (len(chunks), len(self.vocabulary))
+        # Duplicate (row, col) pairs are summed, giving term frequencies
+        tf = sparse.coo_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape).tocsr().tocoo()
+
+        doc_lengths = np.bincount(tf.row, weights=tf.data, minlength=shape[0])
+        doc_freq = np.bincount(tf.col, minlength=shape[1])
+        idf = np.log(1 + (shape[0] - doc_freq + 0.5) / (doc_freq + 0.5))
+        length_norm = k1 * (1 - b + b * doc_lengths / max(doc_lengths.mean(), 1.0)) if shape[0] else doc_lengths
+        weights = idf[tf.col] * tf.data * (k1 + 1) / (tf.data + length_norm[tf.row])
+        self.matrix = sparse.csc_matrix((weights, (tf.row, tf.col)), shape=shape)
+        self.terms = list(self.vocabulary)
+
+    def scores(self, query):
+        \"\"\"BM25 score of every chunk for the query.\"\"\"
+        cols = [self.vocabulary[term] for term in set(tokenize_terms(query)) if term in self.vocabulary]
+        if not cols:
+            return np.zeros(self.matrix.shape[0])
+        return np.asarray(self.matrix[:, cols].sum(axis=1)).ravel()
+
+    def top_terms(self, n=SUMMARY_KEYWORDS):
+        \"\"\"
+        The document's most characteristic terms: highest total BM25 weight across chunks.
+
+        Numbers and tokens shorter than 3 characters (page numbers, years, table cells) are skipped.
+        \"\"\"
+        totals = np.asarray(self.matrix.sum(axis=0)).ravel()
+        ranked = (self.terms[i] for i in np.argsort(-totals))
+        return [term for term in ranked if len(term) >= 3 and not term.isdigit()][:n]
+
+
+def normalize_scores(scores):
+    \"\"\"Min-max scales a dict of scores to 0..1 so lexical and embedding scores can be mixed.\"\"\"
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    return {i: (score - low) / (high - low) if high > low else 1.0 for i, score in scores.items()}
+
+
+def retrieve_chunks(text, doc_hash=None, backend=RETRIEVAL_BACKEND, k=RETRIEVAL_TOP_K, alpha=HYBRID_ALPHA,
+                    on_progress=None):
+    \"\"\"
+    Picks the k chunks that best represent the document.
+
+    The summary query names no topic, so the lexical backends query with the document's own top
+    BM25 terms, which favors the chunks that cover its main subjects.
+
+    Args:
+        text (str): Extracted document text.
+        doc_hash (str): Content hash of the source file, used to cache chunks and the FAISS index.
+        backend (str): 'embeddings', 'bm25' (no network calls) or 'hybrid'.
+        k (int): Number of chunks to return.
+        alpha (float): Weight of the embedding score in hybrid mode (1 - alpha goes to BM25).
+        on_progress (callable): Receives embedding progress (see embed_chunks).
+
+    Returns:
+        list: Chunk texts, best first.
+    \"\"\"
+    if backend == 'embeddings':
+        KnowledgeBase = process_text(text, doc_hash, on_progress)
+        docs = KnowledgeBase.similarity_search_by_vector(embed_summary_query(KnowledgeBase.embedding_function), k=k)
+        return [doc.page_content for doc in docs]
+
+    chunks = get_chunks(text, doc_hash)
+    bm25 = BM25Index(chunks)
+    lexical_scores = bm25.scores(' '.join(bm25.top_terms()))
+    if backend == 'bm25':
+        return [chunks[i] for i in np.argsort(-lexical_scores)[:k]]
+
+    # Hybrid: mix normalized scores over the union of both backends' top candidates
+    KnowledgeBase = process_text(text, doc_hash, on_progress)
+    candidates = min(len(chunks), max(k * 4, HYBRID_CANDIDATES))
+    query_vector = np.asarray([embed_summary_query(KnowledgeBase.embedding_function)], dtype=np.float32)
+    distances, ids = KnowledgeBase.index.search(query_vector, candidates)
+    semantic = normalize_scores({int(i): -float(d) for d, i in zip(distances[0], ids[0]) if i >= 0})
+    lexical = normalize_scores({int(i): float(lexical_scores[i]) for i in np.argsort(-lexical_scores)[:candidates]})
+    combined = {
+        i: alpha * semantic.get(i, 0.0) + (1 - alpha) * lexical.get(i, 0.0)
+        for i in set(semantic) | set(lexical)
+    }
+    return [chunks[i] for i in sorted(combined, key=combined.get, reverse=True)[:k]]
+
+
+def embed_summary_query(embeddings):
+    \"\"\"Returns the embedding of SUMMARY_QUERY, computed once and then read from the cache directory.\"\"\"
+    query_key = hashlib.sha256(f"{EMBEDDING_MODEL}:{SUMMARY_QUERY}".encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(DOC_CACHE_DIR, f"query-{query_key}.npy")
+    if os.path.exists(path):
+        return np.load(path).tolist()
+    vector = embeddings.embed_query(SUMMARY_QUERY)
+    os.makedirs(DOC_CACHE_DIR, exist_ok=True)
+
+    def write_vector(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(vector, dtype=np.float32))
+
+    write_atomic(path, write_vector)
+    return vector
+
+def extract_pdf_page_range(path, start, end):
+    \"\"\"
+    Extracts the text of pages start..end-1 of a PDF; runs in a worker process.
+
+    The file is memory-mapped, so every worker shares the operating system's page cache instead of
+    holding its own copy.
+    \"\"\"
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        pdf_reader = PdfReader(mapped)
+        return [pdf_reader.pages[number].extract_text() or '' for number in range(start, end)]
+
+
+def iter_pdf_pages(path, max_workers=EXTRACT_WORKERS):
+    \"\"\"
+    Yields (page number, text) for every page of a PDF, in page order.
+
+    Large files are split into page ranges that are extracted in a process pool; at most two ranges
+    per worker are in flight, so memory stays bounded however far ahead extraction gets.
+
+    Args:
+        path (str): Path of the PDF file.
+        max_workers (int): Worker processes for large files.
+    \"\"\"
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        pdf_reader = PdfReader(mapped)
+        page_count = len(pdf_reader.pages)
+        if page_count < PARALLEL_MIN_PAGES or max_workers <= 1:
+            for number, page in enumerate(pdf_reader.pages):
+                yield number, page.extract_text() or ''
+            return
+
+    ranges = deque((start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK))
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < max_workers * 2:
+                start, end = ranges.popleft()
+                pending.append((start, executor.submit(extract_pdf_page_range, path, start, end)))
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset, text
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def iter_docx_paragraphs(path):
+    \"\"\"Yields (paragraph number, text) for every paragraph of a DOCX file, with headings marked Markdown-style.\"\"\"
+    document = Document(path)
+    for number, paragraph in enumerate(document.paragraphs):
+        style = paragraph.style.name if paragraph.style is not None else ''
+        level = 1 if style == 'Title' else int(style[8:]) if style.startswith('Heading ') and style[8:].isdigit() else 0
+        yield number, ('#' * level + ' ' if level and paragraph.text else '') + paragraph.text
+
+
+def extract_text_from_pdf(pdf_path):
     \"\"\"
     Extracts text from a PDF file.
 
     Args:
-        pdf_file: The uploaded PDF file object.
+        pdf_path (str): Path of the PDF file.
 
     Returns:
         str: The extracted text.
     \"\"\"
     try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ''
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ''
-        return text
+        return '\\n'.join(text for _, text in iter_pdf_pages(pdf_path))
     except pypdf_errors.PdfStreamError:
         return "ERROR: Could not read PDF. The file might be corrupted or malformed."
     except Exception as e:
         return f"ERROR: An unexpected error occurred while processing the PDF: {e}"
 
 
-def extract_text_from_docx(docx_file):
+def extract_text_from_docx(docx_path):
     \"\"\"
     Extracts text from a DOCX (Word) file.
 
     Args:
-        docx_file: The uploaded DOCX file object.
+        docx_path (str): Path of the DOCX file.
 
     Returns:
         str: The extracted text.
     \"\"\"
     try:
-        document = Document(docx_file)
-        text = ''
-        for paragraph in document.paragraphs:
-            text += paragraph.text + '\\n'
-        return text
+        return ''.join(text + '\\n' for _, text in iter_docx_paragraphs(docx_path))
     except Exception as e:
         return f"ERROR: An error occurred while processing the Word document: {e}"
 
 
-def summerizer(doc_file):
+def extract_text(path):
+    \"\"\"
+    Extracts text from a PDF or Word document on disk.
+
+    Args:
+        path (str): Path of the document; its extension selects the extractor.
+
+    Returns:
+        str: The extracted text, or a message starting with "ERROR:".
+    \"\"\"
+    file_extension = os.path.splitext(path)[1].lower()
+
+    if file_extension == '.pdf':
+        text = extract_text_from_pdf(path)
+    elif file_extension == '.docx':
+        text = extract_text_from_docx(path)
+    else:
+        return "ERROR: Unsupported file type. Please upload a PDF or DOCX document."
+
+    if not text.startswith("ERROR:") and not text.strip():
+        return "ERROR: Could not extract any meaningful text from the provided document. It might be an image-based file, empty, or encrypted."
+    return text
+
+
+def get_llm():
+    \"\"\"Returns the chat model used for every summarization call.\"\"\"
+    return ChatGoogleGenerativeAI(model="{{ model }}", temperature=0.1)
+
+
+def estimate_tokens(text):
+    \"\"\"Estimates the token count of text without a network call (about four characters per token).\"\"\"
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def choose_strategy(tokens):
+    \"\"\"
+    Picks the cheapest strategy that handles a document of the given size.
+
+    Args:
+        tokens (int): Estimated document tokens.
+
+    Returns:
+        str: 'direct' when the whole document fits one call, 'map_reduce' for mid-size documents,
+            or 'hierarchical' when the chunk summaries themselves need several merge levels.
+    \"\"\"
+    if tokens <= DIRECT_MAX_TOKENS:
+        return 'direct'
+    if tokens <= MAP_REDUCE_MAX_TOKENS:
+        return 'map_reduce'
+    return 'hierarchical'
+
+
+def direct_summary(text):
+    \"\"\"Summarizes a document that fits the model's context with a single call.\"\"\"
+    prompt = f\"\"\"
+        Summarize the following document in approximately 3-5 sentences.
+
+        {text}
+        \"\"\"
+    return get_llm().invoke(prompt).content
+
+
+def summarize_chunk(llm, text):
+    \"\"\"Summarizes one section of a document (the map step).\"\"\"
+    prompt = f\"\"\"
+        Summarize the following section of a document in a short paragraph.
+        Keep names, figures, dates and conclusions; skip boilerplate.
+
+        {text}
+        \"\"\"
+    return llm.invoke(prompt).content
+
+
+def combine_summaries(llm, summaries, final=False):
+    \"\"\"Merges consecutive section summaries into one (the reduce step).\"\"\"
+    joined = "\\n\\n".join(summaries)
+    if final:
+        instruction = 'Write a summary of the whole document in approximately 3-5 sentences from these section summaries.'
+    else:
+        instruction = 'Merge these consecutive section summaries into one paragraph, keeping the key facts.'
+    prompt = f\"\"\"
+        {instruction}
+
+        {joined}
+        \"\"\"
+    return llm.invoke(prompt).content
+
+
+def run_concurrently(func, items, max_workers, on_done=None):
+    \"\"\"
+    Calls func on every item with at most max_workers calls in flight.
+
+    Args:
+        func (callable): Function of one item.
+        items (list): Inputs.
+        max_workers (int): Concurrency limit.
+        on_done (callable): Called as on_done(index, result) on the calling thread as each call finishes.
+
+    Returns:
+        list: Results in input order.
+    \"\"\"
+    results = [None] * len(items)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    futures = {executor.submit(func, item): index for index, item in enumerate(items)}
+    try:
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if on_done:
+                on_done(index, results[index])
+    finally:
+        # Drop queued calls if we were interrupted; running calls finish in the background
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    return results
+
+
+def map_reduce_summary(text, max_workers=DEFAULT_CONCURRENCY, on_progress=None, hierarchical=True):
+    \"\"\"
+    Summarizes the whole document: every chunk is summarized concurrently, then the summaries are
+    merged into one final summary.
+
+    Args:
+        text (str): Extracted document text.
+        max_workers (int): Maximum concurrent model calls.
+        on_progress (callable): Called on the calling thread as on_progress(stage, index, total, summary)
+            where stage is 'map' or 'reduce', as each partial summary completes.
+        hierarchical (bool): Merge the summaries in groups, level by level, before the final call,
+            instead of passing all of them to the final call at once.
+
+    Returns:
+        str: The document summary.
+    \"\"\"
+    return summarize_sections(prepare_chunks(text, MAP_CHUNK_TOKENS), max_workers, on_progress, hierarchical)
+
+
+def summarize_sections(chunks, max_workers=DEFAULT_CONCURRENCY, on_progress=None, hierarchical=True):
+    \"\"\"Map and reduce steps of map_reduce_summary over chunks that were already prepared.\"\"\"
+    llm = get_llm()
+
+    def report(stage, total):
+        if on_progress is None:
+            return None
+        return lambda index, summary: on_progress(stage, index, total, summary)
+
+    summaries = run_concurrently(lambda chunk: summarize_chunk(llm, chunk), chunks, max_workers, report('map', len(chunks)))
+    while hierarchical and len(summaries) > REDUCE_GROUP_SIZE:
+        groups = [summaries[i:i + REDUCE_GROUP_SIZE] for i in range(0, len(summaries), REDUCE_GROUP_SIZE)]
+        summaries = run_concurrently(lambda group: combine_summaries(llm, group), groups, max_workers, report('reduce', len(groups)))
+    return combine_summaries(llm, summaries, final=True)
+
+
+def retrieval_summary(text, doc_hash=None, on_progress=None, backend=RETRIEVAL_BACKEND):
+    \"\"\"Summarizes only the most representative passages, using one "stuff" chain call.\"\"\"
+    return summarize_passages(retrieve_chunks(text, doc_hash, backend=backend, on_progress=on_progress))
+
+
+def summarize_passages(passages):
+    \"\"\"Summarizes passages picked by retrieve_chunks with one "stuff" chain call.\"\"\"
+    docs = [LangchainDocument(page_content=passage) for passage in passages]
+
+    llm = get_llm()
+
+    chain = load_qa_chain(llm, chain_type='stuff')
+
+    return chain.run(input_documents=docs, question=SUMMARY_QUERY)
+
+
+def summarize_text(text, mode='auto', max_workers=DEFAULT_CONCURRENCY, on_progress=None, doc_hash=None,
+                   retrieval_backend=RETRIEVAL_BACKEND):
+    \"\"\"
+    Summarizes extracted text with the given strategy, or the one chosen by its size when mode is 'auto'.
+
+    Args:
+        text (str): Extracted document text.
+        mode (str): One of STRATEGIES.
+        max_workers (int): Maximum concurrent model calls for map-reduce strategies.
+        on_progress (callable): Receives partial summaries (see map_reduce_summary), or embedding
+            progress for the retrieval strategy (see embed_chunks).
+        doc_hash (str): Content hash of the source file, used to cache the retrieval index.
+        retrieval_backend (str): One of RETRIEVAL_BACKENDS, for the retrieval strategy.
+
+    Returns:
+        tuple: (summary, info) where info holds the strategy, estimated tokens and elapsed seconds.
+    \"\"\"
+    tokens = estimate_tokens(text)
+    strategy = choose_strategy(tokens) if mode == 'auto' else mode
+    start = time.perf_counter()
+
+    if strategy == 'direct':
+        summary = direct_summary(text)
+    elif strategy in ('map_reduce', 'hierarchical'):
+        summary = map_reduce_summary(
+            text, max_workers=max_workers, on_progress=on_progress, hierarchical=strategy == 'hierarchical'
+        )
+    else:
+        summary = retrieval_summary(text, doc_hash, on_progress, backend=retrieval_backend)
+
+    info = {'strategy': strategy, 'tokens': tokens, 'seconds': time.perf_counter() - start}
+    logger.info("strategy=%s mode=%s tokens=%d seconds=%.2f", strategy, mode, tokens, info['seconds'])
+    return summary, info
+
+
+def summerizer(doc_file, mode='auto', max_workers=DEFAULT_CONCURRENCY, on_progress=None,
+               retrieval_backend=RETRIEVAL_BACKEND):
     \"\"\"
     Summarizes the content of an uploaded PDF or Word document using the Gemini API.
 
     Args:
         doc_file: The uploaded document file object (PDF or DOCX).
+        mode (str): One of STRATEGIES; 'auto' picks direct, map-reduce or hierarchical by document size,
+            and 'retrieval' summarizes only the passages that best match the summary query.
+        max_workers (int): Maximum concurrent model calls for map-reduce strategies.
+        on_progress (callable): Receives partial summaries (see map_reduce_summary).
+        retrieval_backend (str): One of RETRIEVAL_BACKENDS, for the retrieval strategy.
 
     Returns:
         str: The summarized text of the document, or an error message.
@@ -114,37 +1346,470 @@ def summerizer(doc_file):
     if doc_file is None:
         return "No document file uploaded."
 
-    file_extension = os.path.splitext(doc_file.name)[1].lower()
-    text = ''
-
-    if file_extension == '.pdf':
-        text = extract_text_from_pdf(doc_file)
-    elif file_extension == '.docx':
-        text = extract_text_from_docx(doc_file)
-    else:
-        return "Unsupported file type. Please upload a PDF or DOCX document."
-
+    doc_hash, text = load_document(doc_file)
     if text.startswith("ERROR:"):
         return text
 
-    if not text.strip():
-        return "Could not extract any meaningful text from the provided document. It might be an image-based file, empty, or encrypted."
+    try:
+        return summarize_text(
+            text, mode=mode, max_workers=max_workers, on_progress=on_progress, doc_hash=doc_hash,
+            retrieval_backend=retrieval_backend
+        )[0]
+    except Exception as e:
+        return f"ERROR: An error occurred during summarization with the LLM: {e}"
 
-    KnowledgeBase = process_text(text)
-    query = 'summarize the content of the uploaded document in approximately 3-5 sentences'
 
-    if query:
-        docs = KnowledgeBase.similarity_search(query)
+class JobQueue:
+    \"\"\"
+    Process-local queue of summarization jobs run by a small worker pool.
+
+    Jobs are identified by a random ID, which sessions keep and poll, and deduplicated by a key built
+    from their inputs: submitting work whose job has not been fetched yet returns that job instead of
+    starting another. Finished jobs are kept until fetched, or until result_ttl seconds after they
+    finish if nobody comes back for them.
+    \"\"\"
 
-        llm = ChatGoogleGenerativeAI(model="{{ model }}", temperature=0.1)
+    def __init__(self, max_workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL):
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summary-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids_by_key = {}
 
-        chain = load_qa_chain(llm, chain_type='stuff')
+    def submit(self, key, func, *args, **kwargs):
+        \"\"\"
+        Queues func(*args, on_progress=callback, **kwargs).
 
+        Returns:
+            tuple: (job ID, True if a new job was queued or False if an unfetched job had the same key).
+        \"\"\"
+        with self._lock:
+            self._expire()
+            if key in self._ids_by_key:
+                return self._ids_by_key[key], False
+            job = {
+                'id': uuid.uuid4().hex, 'key': key, 'state': 'queued', 'progress': None, 'partials': [],
+                'result': None, 'error': None, 'submitted': time.time(), 'finished': None,
+            }
+            self._jobs[job['id']] = job
+            self._ids_by_key[key] = job['id']
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job['id'], True
+
+    def _run(self, job, func, args, kwargs):
+        level = {'key': None, 'done': 0}
+
+        def on_progress(stage, index, total, detail):
+            # Embedding reports a running count; map and reduce report each finished item
+            if stage == 'embed':
+                done = index
+            else:
+                # Each reduce level has fewer groups than the one before, so a new (stage, total)
+                # means a new level whose count starts from zero
+                if level['key'] != (stage, total):
+                    level['key'], level['done'] = (stage, total), 0
+                level['done'] += 1
+                done = level['done']
+            with self._lock:
+                job['progress'] = (stage, done, total, detail)
+                if stage != 'embed':
+                    job['partials'].append((stage, index, detail))
+
+        with self._lock:
+            job['state'] = 'running'
         try:
-            response = chain.run(input_documents=docs, question=query)
-            return response
+            update = {'state': 'done', 'result': func(*args, on_progress=on_progress, **kwargs)}
         except Exception as e:
-            return f"ERROR: An error occurred during summarization with the LLM: {e}"
-    else:
-        return "Summarization query is empty."
-"""
\ No newline at end of file
+            logger.exception("job %s failed", job['id'])
+            update = {'state': 'failed', 'error': str(e)}
+        with self._lock:
+            job.update(update, finished=time.time())
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job['finished'] is not None and now - job['finished'] > self.result_ttl:
+                del self._jobs[job_id]
+                self._ids_by_key.pop(job['key'], None)
+
+    def status(self, job_id):
+        \"\"\"Returns a snapshot of a job, or None if the ID is unknown, already fetched or expired.\"\"\"
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job, partials=list(job['partials']))
+
+    def fetch(self, job_id):
+        \"\"\"Removes and returns a finished job; returns None while it is still queued or running.\"\"\"
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['finished'] is None:
+                return None
+            del self._jobs[job_id]
+            self._ids_by_key.pop(job['key'], None)
+            return job
+
+
+def summarize_spooled(path, doc_hash, mode='auto', max_workers=DEFAULT_CONCURRENCY, on_progress=None,
+                      retrieval_backend=RETRIEVAL_BACKEND):
+    \"\"\"
+    Extracts and summarizes a spooled upload; the job body run by JobQueue.
+
+    Returns:
+        tuple: (summary, info) as returned by summarize_text, or (error message, None).
+    \"\"\"
+    text = read_document(path, doc_hash)
+    if text.startswith("ERROR:"):
+        return text, None
+    try:
+        return summarize_text(
+            text, mode=mode, max_workers=max_workers, on_progress=on_progress, doc_hash=doc_hash,
+            retrieval_backend=retrieval_backend
+        )
+    except Exception as e:
+        return f"ERROR: An error occurred during summarization with the LLM: {e}", None
+
+
+def submit_summary(queue, doc_file, mode='auto', max_workers=DEFAULT_CONCURRENCY, retrieval_backend=RETRIEVAL_BACKEND):
+    \"\"\"
+    Queues the summary of an upload and returns the job ID.
+
+    The upload is spooled on the calling thread, since the file object belongs to the Streamlit
+    session; the same file with the same settings maps to the job already queued for it.
+    \"\"\"
+    path, doc_hash = spool_upload(doc_file)
+    job_id, created = queue.submit(
+        (doc_hash, mode, max_workers, retrieval_backend), summarize_spooled, path, doc_hash,
+        mode=mode, max_workers=max_workers, retrieval_backend=retrieval_backend
+    )
+    if not created:
+        os.remove(path)
+    return job_id
+
+
+def iter_batch_sources(source):
+    \"\"\"
+    Lists the PDF and Word documents in a directory tree or a zip archive.
+
+    Args:
+        source: Directory path, zip file path, or zip file object.
+
+    Yields:
+        tuple: (name, open) where name is the path inside the source and open() returns a readable,
+            seekable binary file object with a name attribute.
+    \"\"\"
+    if isinstance(source, str) and os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.lower().endswith(BATCH_EXTENSIONS):
+                    path = os.path.join(root, file_name)
+                    yield os.path.relpath(path, source), lambda path=path: open(path, 'rb')
+        return
+
+    archive = zipfile.ZipFile(source)
+    for member in sorted(archive.namelist()):
+        if member.lower().endswith(BATCH_EXTENSIONS) and not member.startswith('__MACOSX/'):
+            # ZipFile serializes reads of its members, so workers can open them concurrently
+            yield member, lambda member=member: archive.open(member)
+
+
+def upload_sources(uploads):
+    \"\"\"
+    Turns Streamlit uploads into (name, open) pairs like iter_batch_sources, expanding zip archives.
+
+    Each open() returns a copy of the upload's bytes, so workers never share or close the upload itself.
+    \"\"\"
+    for upload in uploads:
+        if upload.name.lower().endswith('.zip'):
+            for name, open_member in iter_batch_sources(upload):
+                yield f"{upload.name}/{name}", open_member
+        else:
+            def open_upload(upload=upload):
+                data = io.BytesIO(upload.getvalue())
+                data.name = upload.name
+                return data
+
+            yield upload.name, open_upload
+
+
+def read_batch_records(output_path):
+    \"\"\"Records of earlier runs writing to output_path, by document name; a retried document's last record wins.\"\"\"
+    if not os.path.exists(output_path):
+        return {}
+    with open(output_path, newline='', encoding='utf-8') as f:
+        if output_path.endswith('.csv'):
+            records = list(csv.DictReader(f))
+        else:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line cut short by an interrupted run
+                    continue
+    latest = {}
+    for record in records:
+        if record.get('name'):
+            latest.pop(record['name'], None)
+            latest[record['name']] = record
+    return latest
+
+
+def read_finished(output_path):
+    \"\"\"Names of documents summarized without error by an earlier run writing to output_path.\"\"\"
+    return {name for name, record in read_batch_records(output_path).items() if not record.get('error')}
+
+
+def compact_batch_output(output_path):
+    \"\"\"Rewrites output_path with one record per document, dropping the failures that a retry replaced.\"\"\"
+    records = read_batch_records(output_path)
+
+    def write_records(tmp_path):
+        writer = BatchWriter(tmp_path, is_csv=output_path.endswith('.csv'))
+        try:
+            for record in records.values():
+                writer.write(record)
+        finally:
+            writer.close()
+
+    write_atomic(output_path, write_records)
+
+
+class BatchWriter:
+    \"\"\"Appends batch records to a JSONL or CSV file (chosen by extension), flushing each one as it is written.\"\"\"
+
+    def __init__(self, output_path, is_csv=None):
+        self.is_csv = output_path.endswith('.csv') if is_csv is None else is_csv
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        is_new = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self._file = open(output_path, 'a', newline='', encoding='utf-8')
+        if not is_new:
+            with open(output_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\\n':
+                    # Start on a fresh line after a record cut short by an interrupted run
+                    self._file.write('\\n')
+        if self.is_csv:
+            self._csv = csv.DictWriter(self._file, fieldnames=BATCH_FIELDS, extrasaction='ignore')
+            if is_new:
+                self._csv.writeheader()
+
+    def write(self, record):
+        if self.is_csv:
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps({field: record.get(field) for field in BATCH_FIELDS}) + '\\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def run_document_batch(sources, output_path, mode='auto', max_workers=DEFAULT_CONCURRENCY,
+                       retrieval_backend=RETRIEVAL_BACKEND, extract_workers=BATCH_EXTRACT_WORKERS,
+                       prepare_workers=BATCH_PREPARE_WORKERS, summary_workers=BATCH_SUMMARY_WORKERS, on_result=None):
+    \"\"\"
+    Summarizes many documents through a three-stage pipeline and appends one record per document to output_path.
+
+    Extraction, chunking plus embedding, and summarization each run on their own worker threads,
+    joined by queues of BATCH_QUEUE_SIZE documents, so a slow stage holds back the ones before it
+    instead of letting extracted text pile up in memory. Documents already in output_path without
+    an error are skipped, so an interrupted batch resumes where it stopped; failed ones are retried
+    and their new record replaces the old one.
+
+    Args:
+        sources: (name, open) pairs as yielded by iter_batch_sources.
+        output_path (str): .jsonl or .csv file for the results.
+        mode (str): One of STRATEGIES, applied to every document.
+        max_workers (int): Concurrent model calls within one map-reduce document.
+        retrieval_backend (str): One of RETRIEVAL_BACKENDS, for the retrieval strategy.
+        extract_workers (int): Documents extracted at once.
+        prepare_workers (int): Documents chunked and embedded at once.
+        summary_workers (int): Documents summarized at once.
+        on_result (callable): Called on the calling thread as on_result(name, status, error)
+            where status is 'done', 'skipped' or 'failed'.
+
+    Returns:
+        dict: Counts of done, skipped and failed documents.
+    \"\"\"
+    finished = read_finished(output_path)
+    summary = {'done': 0, 'skipped': 0, 'failed': 0}
+    stop = threading.Event()
+    stop_marker = object()
+    queues = [queue.Queue(maxsize=BATCH_QUEUE_SIZE) for _ in range(4)]
+
+    def put(target, item):
+        # Gives up when the batch is abandoned, so no worker stays blocked on a full queue
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def extract(record):
+        with record.pop('open')() as source:
+            path, record['sha256'] = spool_upload(source)
+        record['text'] = read_document(path, record['sha256'])
+        if record['text'].startswith("ERROR:"):
+            record['error'] = record['text']
+
+    def prepare(record):
+        text = record.pop('text')
+        record['tokens'] = estimate_tokens(text)
+        record['strategy'] = choose_strategy(record['tokens']) if mode == 'auto' else mode
+        if record['strategy'] == 'retrieval':
+            record['input'] = retrieve_chunks(text, record['sha256'], backend=retrieval_backend)
+        elif record['strategy'] in ('map_reduce', 'hierarchical'):
+            record['input'] = prepare_chunks(text, MAP_CHUNK_TOKENS)
+        else:
+            record['input'] = text
+
+    def summarize(record):
+        start = time.perf_counter()
+        strategy, document_input = record['strategy'], record.pop('input')
+        if strategy == 'direct':
+            record['summary'] = direct_summary(document_input)
+        elif strategy == 'retrieval':
+            record['summary'] = summarize_passages(document_input)
+        else:
+            record['summary'] = summarize_sections(document_input, max_workers, hierarchical=strategy == 'hierarchical')
+        record['seconds'] = round(time.perf_counter() - start, 2)
+
+    def start_stage(func, inbox, outbox, workers):
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work():
+            while not stop.is_set():
+                try:
+                    record = inbox.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if record is stop_marker:
+                    break
+                if not record.get('error'):
+                    try:
+                        func(record)
+                    except Exception as e:
+                        record['error'] = str(e)
+                if not put(outbox, record):
+                    return
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            # The last worker out tells the next stage that no more documents are coming
+            if last:
+                put(outbox, stop_marker)
+            else:
+                put(inbox, stop_marker)
+
+        for _ in range(workers):
+            threading.Thread(target=work, daemon=True).start()
+
+    def feed():
+        for name, open_source in sources:
+            record = {'name': name, 'open': open_source, 'error': None}
+            if name in finished:
+                record['skipped'] = True
+                target = queues[-1]
+            else:
+                target = queues[0]
+            if not put(target, record):
+                return
+        put(queues[0], stop_marker)
+
+    writer = BatchWriter(output_path)
+    try:
+        start_stage(extract, queues[0], queues[1], extract_workers)
+        start_stage(prepare, queues[1], queues[2], prepare_workers)
+        start_stage(summarize, queues[2], queues[3], summary_workers)
+        threading.Thread(target=feed, daemon=True).start()
+
+        while True:
+            record = queues[3].get()
+            if record is stop_marker:
+                break
+            if record.get('skipped'):
+                status = 'skipped'
+            else:
+                status = 'failed' if record.get('error') else 'done'
+                writer.write(record)
+            summary[status] += 1
+            if on_result:
+                on_result(record['name'], status, record.get('error'))
+    finally:
+        stop.set()
+        writer.close()
+    compact_batch_output(output_path)
+    logger.info("batch done=%d skipped=%d failed=%d", summary['done'], summary['skipped'], summary['failed'])
+    return summary
+"""
+
+DOCUMENT_BATCH_TEMPLATE = """\"\"\"
+Headless batch summarization for {{ tool_name }}.
+
+Usage:
+    python batch.py contracts/ --output summaries.jsonl --strategy auto --summary-workers 4
+    python batch.py contracts.zip --output summaries.csv
+
+The source is a directory (searched recursively) or a zip archive of PDF and Word files.
+Each summary is appended to the JSONL or CSV output as soon as it is ready. Documents already
+summarized in the output file are skipped, so rerunning resumes an interrupted batch.
+\"\"\"
+import argparse
+import sys
+from utils import (
+    iter_batch_sources, run_document_batch, DEFAULT_CONCURRENCY, STRATEGIES, RETRIEVAL_BACKENDS, RETRIEVAL_BACKEND,
+    BATCH_EXTRACT_WORKERS, BATCH_PREPARE_WORKERS, BATCH_SUMMARY_WORKERS
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize every PDF and Word document in a directory or zip archive')
+    parser.add_argument('source', help='Directory or zip archive of .pdf and .docx files')
+    parser.add_argument('--output', default='summaries.jsonl', help='Output .jsonl or .csv file (default: summaries.jsonl)')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='auto', help='Summarization strategy (default: auto)')
+    parser.add_argument('--retrieval-backend', choices=RETRIEVAL_BACKENDS, default=RETRIEVAL_BACKEND,
+                        help='Passage selection for the retrieval strategy')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Model calls at once within one map-reduce document (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--extract-workers', type=int, default=BATCH_EXTRACT_WORKERS,
+                        help=f'Documents extracted at once (default: {BATCH_EXTRACT_WORKERS})')
+    parser.add_argument('--prepare-workers', type=int, default=BATCH_PREPARE_WORKERS,
+                        help=f'Documents chunked and embedded at once (default: {BATCH_PREPARE_WORKERS})')
+    parser.add_argument('--summary-workers', type=int, default=BATCH_SUMMARY_WORKERS,
+                        help=f'Documents summarized at once (default: {BATCH_SUMMARY_WORKERS})')
+    args = parser.parse_args()
+
+    if not args.output.endswith(('.jsonl', '.csv')):
+        parser.error('--output must end in .jsonl or .csv')
+    print(f"Summarizing documents from {args.source} into {args.output}...")
+
+    def print_result(name, status, error):
+        detail = f" ({error})" if error else ""
+        print(f"[{status}] {name}{detail}")
+
+    summary = run_document_batch(
+        iter_batch_sources(args.source),
+        args.output,
+        mode=args.strategy,
+        max_workers=args.concurrency,
+        retrieval_backend=args.retrieval_backend,
+        extract_workers=args.extract_workers,
+        prepare_workers=args.prepare_workers,
+        summary_workers=args.summary_workers,
+        on_result=print_result,
+    )
+    print(f"Done: {summary['done']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+"""
@@ -1,90 +1,794 @@
-"""
-SQL Generator template for AIToolMaker.
-"""
-
-SQL_GENERATOR_TEMPLATE = """import streamlit as st
-import google.generativeai as genai
-from api_key import GEMINI_API_KEY
-
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('{{ model }}')
-
-def main():
-    st.set_page_config(page_title='{{ tool_name }}')
-    
-    st.markdown(
-        \"\"\"
-            <div style='text-align: center;'>
-                <h1>{{ tool_name }}</h1>
-                <h3>I can generate SQL queries for you!</h3>
-            </div>
-        \"\"\",
-        unsafe_allow_html=True
-    )
-    
-    text_input = st.text_area('Enter your Query description here...')
-    database_context = st.text_area('Optional: Provide database schema or context (e.g., table names, columns)...')
-    dialect = st.selectbox('Optional: Specify SQL dialect', ['Generic SQL', 'PostgreSQL', 'MySQL', 'SQLite'])
-    
-    submit = st.button('Generate SQL Query')
-    
-    if submit:
-        if not text_input:
-            st.warning("Please enter a query description.")
-            return
-        
-        with st.spinner('Generating SQL Query...'):
-            try:
-                template = f\"\"\"
-                    Create a SQL query snippet based on the following description:
-                    ```
-                    {text_input}
-                    ```
-                    {'considering the following database context: ' + database_context if database_context else ''}
-                    {'Ensure the query is compatible with ' + dialect + '.' if dialect != 'Generic SQL' else ''}
-                    I just want the SQL query.
-                    \"\"\"
-                
-                response = model.generate_content(template)
-                sql_query = response.text
-                sql_query = sql_query.strip().lstrip('```sql').rstrip('```')
-                
-                expected_output = f\"\"\"
-                    What would be the expected response of this SQL Query snippet:
-                    ```sql
-                    {sql_query}
-                    ```
-                    Provide a sample tabular response formatted as a Markdown table, with no additional explanation.
-                    \"\"\"
-                
-                output_response = model.generate_content(expected_output)
-                output = output_response.text
-                
-                explanation = f\"\"\"
-                    Explain this SQL Query:
-                    ```sql
-                    {sql_query}
-                    ```
-                    Please provide a concise explanation.
-                    \"\"\"
-                
-                explanation_response = model.generate_content(explanation)
-                explanation_text = explanation_response.text
-                
-                with st.container():
-                    st.success('SQL Query Generated Successfully! Here is your Query Below:')
-                    st.code(sql_query, language='sql')
-                    
-                    st.success('Expected Output of this SQL Query will be:')
-                    st.markdown(f"```\\n{output}\\n```")
-                    
-                    st.success('Explanation of this SQL Query:')
-                    st.markdown(explanation_text)
-                    
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
-
-if __name__ == "__main__":
-    main()
-"""
\ No newline at end of file
+"""
+SQL Generator templates for AIToolMaker.
+"""
+
+SQL_GENERATOR_TEMPLATE = """import streamlit as st
+from utils import (
+    model, build_query_prompt, clean_sql, generate_followups, generate_explanation,
+    sandbox_hash, build_sandbox, introspect_sandbox, run_sandbox_query, SANDBOX_ROW_LIMIT,
+    parse_ddl, format_schema, schema_hash, SchemaIndex, embed_texts, QueryCache
+)
+
+@st.cache_resource(show_spinner=False)
+def load_sandbox(content_hash, _files):
+    \"\"\"Builds and introspects the sandbox database once per set of uploaded files.\"\"\"
+    db_path = build_sandbox(_files, content_hash)
+    return db_path, introspect_sandbox(db_path)
+
+@st.cache_resource(show_spinner=False)
+def load_schema_index(schema_fingerprint, _entries):
+    \"\"\"Builds the table index, including its embeddings, once per schema.\"\"\"
+    return SchemaIndex(_entries)
+
+@st.cache_resource
+def get_query_cache():
+    \"\"\"Opens the persistent answer cache shared by all sessions.\"\"\"
+    return QueryCache()
+
+def main():
+    st.set_page_config(page_title='{{ tool_name }}')
+
+    st.markdown(
+        \"\"\"
+            <div style='text-align: center;'>
+                <h1>{{ tool_name }}</h1>
+                <h3>I can generate SQL queries for you!</h3>
+            </div>
+        \"\"\",
+        unsafe_allow_html=True
+    )
+
+    text_input = st.text_area('Enter your Query description here...')
+    database_context = st.text_area('Optional: Provide database schema or context (e.g., table names, columns)...')
+    dialect = st.selectbox('Optional: Specify SQL dialect', ['Generic SQL', 'PostgreSQL', 'MySQL', 'SQLite'])
+
+    # DDL is indexed per table; any other free text is passed through as-is
+    schema_entries = parse_ddl(database_context) if database_context else []
+    extra_context = '' if schema_entries else database_context
+
+    # Optional sandbox: generated queries run against real data instead of a model-invented output
+    sandbox_files = st.file_uploader(
+        'Optional: Upload a SQLite database, or schema DDL (.sql) with sample CSVs, to run the query',
+        type=['sqlite', 'sqlite3', 'db', 'sql', 'csv'],
+        accept_multiple_files=True
+    )
+    db_path = None
+    if sandbox_files:
+        files = [(f.name, f.getvalue()) for f in sandbox_files]
+        try:
+            db_path, sandbox_entries = load_sandbox(sandbox_hash(files), files)
+        except Exception as e:
+            st.error(f"Could not load the sandbox database: {e}")
+        else:
+            with st.expander('Sandbox schema'):
+                st.code(format_schema(sandbox_entries) or '(no tables)', language='sql')
+            # The sandbox is what the query runs against, so its tables replace same-named DDL tables
+            sandbox_names = {entry['name'].lower() for entry in sandbox_entries}
+            schema_entries = [entry for entry in schema_entries if entry['name'].lower() not in sandbox_names] + sandbox_entries
+            if dialect != 'SQLite':
+                st.info('Queries are run in a SQLite sandbox, so the SQLite dialect is used.')
+                dialect = 'SQLite'
+
+    schema_index = None
+    if schema_entries:
+        with st.spinner('Indexing schema...'):
+            schema_index = load_schema_index(schema_hash(schema_entries), schema_entries)
+        st.caption(f"Schema index: {len(schema_entries)} tables")
+
+    use_cache = st.checkbox('Reuse cached answers for the same or a very similar request', value=True)
+    submit = st.button('Generate SQL Query')
+
+    if submit:
+        if not text_input:
+            st.warning("Please enter a query description.")
+            return
+
+        # Answers are cached per schema fingerprint, so editing the schema never serves a stale query
+        fingerprint = schema_hash(schema_entries, extra_context)
+        embeddings = []
+
+        def question_embedding():
+            \"\"\"Embeds the request at most once, and only when a similarity lookup or the schema index needs it.\"\"\"
+            if not embeddings:
+                try:
+                    embeddings.append(embed_texts([text_input], 'retrieval_query')[0])
+                except Exception:
+                    embeddings.append(None)
+            return embeddings[0]
+
+        query_cache = get_query_cache()
+        cached = query_cache.lookup(text_input, fingerprint, dialect, embed=question_embedding) if use_cache else None
+
+        try:
+            with st.container():
+                st.success('SQL Query Generated Successfully! Here is your Query Below:')
+                query_placeholder = st.empty()
+                if cached is not None:
+                    sql_query = cached['sql_query']
+                    query_placeholder.code(sql_query, language='sql')
+                    if cached['match'] == 'exact':
+                        st.caption('Answered from cache.')
+                    else:
+                        st.caption(f"Answered from cache for a similar request: {cached['description']}")
+                else:
+                    prompt_context = extra_context
+                    if schema_index is not None:
+                        # Only the tables relevant to this request go into the prompt, so its size does not grow with the schema
+                        query_embedding = question_embedding() if schema_index.embeddings is not None else None
+                        selected = schema_index.search(text_input, query_embedding=query_embedding)
+                        prompt_context = "\\n".join(part for part in [format_schema(selected), extra_context] if part)
+                        if len(selected) < len(schema_entries):
+                            st.caption(f"Using {len(selected)} of {len(schema_entries)} tables: {', '.join(entry['name'] for entry in selected)}")
+
+                    # Stream the query so it is visible before the follow-up calls start
+                    raw_query = ""
+                    with st.spinner('Generating SQL Query...'):
+                        for chunk in model.generate_content(build_query_prompt(text_input, prompt_context, dialect), stream=True):
+                            raw_query += chunk.text
+                            query_placeholder.code(clean_sql(raw_query), language='sql')
+                    sql_query = clean_sql(raw_query)
+                    query_placeholder.code(sql_query, language='sql')
+
+                output = None
+                if db_path:
+                    with st.spinner('Running the query in the sandbox...'):
+                        try:
+                            result = run_sandbox_query(db_path, sql_query)
+                        except Exception as e:
+                            result = None
+                            st.error(f"The query failed in the sandbox: {e}")
+                        explanation_text = cached['explanation'] if cached is not None else generate_explanation(sql_query)
+
+                    if result is not None:
+                        st.success(f"Sandbox result ({result['elapsed'] * 1000:.1f} ms):")
+                        if result['columns']:
+                            st.dataframe([dict(zip(result['columns'], row)) for row in result['rows']])
+                            if result['truncated']:
+                                st.caption(f"Showing the first {SANDBOX_ROW_LIMIT} rows.")
+                        else:
+                            st.write(f"Statement executed; {result['rowcount']} rows affected (changes are discarded).")
+                        if result['plan']:
+                            with st.expander('Query plan'):
+                                st.code("\\n".join(result['plan']))
+                elif cached is not None and cached['output'] is not None:
+                    output, explanation_text = cached['output'], cached['explanation']
+                else:
+                    # Expected output and explanation only depend on the query, so they run concurrently
+                    with st.spinner('Generating expected output and explanation...'):
+                        output, explanation_text = generate_followups(sql_query)
+
+                if output is not None:
+                    st.success('Expected Output of this SQL Query will be:')
+                    st.markdown(f"```\\n{output}\\n```")
+
+                st.success('Explanation of this SQL Query:')
+                st.markdown(explanation_text)
+
+                # A query that failed in the sandbox is not worth reusing. Without an embedding
+                # (cache lookups off, small schema) the entry still serves exact repeats.
+                if cached is None and not (db_path and result is None):
+                    embedding = embeddings[0] if embeddings else None
+                    query_cache.store(text_input, fingerprint, dialect, sql_query, explanation_text, output, embedding)
+
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
+"""
+
+SQL_UTILS_TEMPLATE = """import csv
+import hashlib
+import io
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+import google.generativeai as genai
+from api_key import GEMINI_API_KEY
+
+# Configure Gemini API
+genai.configure(api_key=GEMINI_API_KEY)
+model = genai.GenerativeModel('{{ model }}')
+
+# Sandbox execution of generated queries
+SANDBOX_DIR = ".sql_sandbox"
+SANDBOX_ROW_LIMIT = 1000
+SANDBOX_TIMEOUT_SECONDS = 5
+SANDBOX_BUILD_TIMEOUT_SECONDS = 60
+# PRAGMAs that take an argument but only describe the schema; any other PRAGMA with an argument is a write
+SANDBOX_READ_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "collation_list", "function_list", "pragma_list", "database_list",
+}
+SQLITE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+
+# Schema index: only the most relevant tables are sent with each request
+SCHEMA_TOP_K = 8
+RRF_K = 60
+EMBEDDING_MODEL = "models/embedding-001"
+EMBEDDING_BATCH_SIZE = 100
+CREATE_TABLE_RE = re.compile(
+    r'CREATE\\s+(?:OR\\s+REPLACE\\s+)?(?:TEMP(?:ORARY)?\\s+)?TABLE\\s+(?:IF\\s+NOT\\s+EXISTS\\s+)?([\\w."`\\[\\]]+)\\s*\\(',
+    re.IGNORECASE
+)
+REFERENCES_RE = re.compile(r'REFERENCES\\s+([\\w."`\\[\\]]+)', re.IGNORECASE)
+CONSTRAINT_KEYWORDS = {"PRIMARY", "FOREIGN", "CONSTRAINT", "UNIQUE", "CHECK", "KEY", "INDEX"}
+
+# Persistent cache of generated answers
+QUERY_CACHE_PATH = ".sql_cache.sqlite"
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("SQL_GENERATOR_CACHE_MB", "50")) * 1024 ** 2
+QUERY_CACHE_SIMILARITY = 0.95
+
+
+def build_query_prompt(text_input, database_context, dialect):
+    \"\"\"
+    Builds the prompt that asks the model for the SQL query.
+
+    Args:
+        text_input (str): Natural language description of the query.
+        database_context (str): Optional schema or context.
+        dialect (str): SQL dialect, or 'Generic SQL'.
+
+    Returns:
+        str: The prompt text.
+    \"\"\"
+    return f\"\"\"
+        Create a SQL query snippet based on the following description:
+        ```
+        {text_input}
+        ```
+        {'considering the following database context: ' + database_context if database_context else ''}
+        {'Ensure the query is compatible with ' + dialect + '.' if dialect != 'Generic SQL' else ''}
+        I just want the SQL query.
+        \"\"\"
+
+
+def clean_sql(text):
+    \"\"\"Removes Markdown code fences (complete or still streaming) around a generated query.\"\"\"
+    text = re.sub(r"^\\s*```[a-zA-Z]*\\s*", "", text)
+    text = re.sub(r"\\s*`{1,3}\\s*$", "", text)
+    return text.strip()
+
+
+def build_expected_output_prompt(sql_query):
+    \"\"\"Builds the prompt for a sample result table of the query.\"\"\"
+    return f\"\"\"
+        What would be the expected response of this SQL Query snippet:
+        ```sql
+        {sql_query}
+        ```
+        Provide a sample tabular response formatted as a Markdown table, with no additional explanation.
+        \"\"\"
+
+
+def build_explanation_prompt(sql_query):
+    \"\"\"Builds the prompt for a short explanation of the query.\"\"\"
+    return f\"\"\"
+        Explain this SQL Query:
+        ```sql
+        {sql_query}
+        ```
+        Please provide a concise explanation.
+        \"\"\"
+
+
+def generate_followups(sql_query):
+    \"\"\"
+    Requests the expected output and the explanation of a query at the same time.
+
+    Both calls depend only on the query, so running them concurrently costs one round trip instead of two.
+
+    Returns:
+        tuple: (expected output text, explanation text)
+    \"\"\"
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        output_future = executor.submit(model.generate_content, build_expected_output_prompt(sql_query))
+        explanation_future = executor.submit(model.generate_content, build_explanation_prompt(sql_query))
+        return output_future.result().text, explanation_future.result().text
+
+
+def generate_explanation(sql_query):
+    \"\"\"Requests only the explanation, for when the query's real output comes from the sandbox.\"\"\"
+    return model.generate_content(build_explanation_prompt(sql_query)).text
+
+
+def sandbox_hash(files):
+    \"\"\"
+    Hashes a set of uploaded sandbox files (names and contents).
+
+    Args:
+        files (list): (file name, bytes) pairs.
+
+    Returns:
+        str: Hex digest identifying the sandbox.
+    \"\"\"
+    digest = hashlib.sha256()
+    for name, data in sorted(files):
+        digest.update(name.encode("utf-8") + b"\\0" + hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+def quote_identifier(name):
+    \"\"\"Quotes a table or column name for SQLite.\"\"\"
+    return '"' + name.replace('"', '""') + '"'
+
+
+def load_csv_into_sqlite(conn, table_name, data):
+    \"\"\"Loads CSV bytes into a table, creating it from the header if the DDL did not define it.\"\"\"
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig")))
+    header = next(reader, None)
+    if not header:
+        return
+    table = quote_identifier(table_name)
+    columns = ", ".join(quote_identifier(column) for column in header)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    placeholders = ", ".join("?" for _ in header)
+    conn.executemany(
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+        (tuple(value if value != "" else None for value in row) for row in reader if row)
+    )
+
+
+def build_sandbox(files, content_hash, sandbox_dir=SANDBOX_DIR):
+    \"\"\"
+    Builds the sandbox database file from the uploads, once per content hash.
+
+    Accepts either one SQLite database file, or schema DDL (.sql) plus sample CSVs named after their tables.
+    The DDL runs under build_authorizer and is aborted after SANDBOX_BUILD_TIMEOUT_SECONDS.
+
+    Args:
+        files (list): (file name, bytes) pairs.
+        content_hash (str): Hash from sandbox_hash.
+        sandbox_dir (str): Directory for prepared sandbox databases.
+
+    Returns:
+        str: Path of the prepared SQLite database.
+    \"\"\"
+    os.makedirs(sandbox_dir, exist_ok=True)
+    db_path = os.path.join(sandbox_dir, f"{content_hash}.sqlite")
+    if os.path.exists(db_path):
+        return db_path
+
+    tmp_path = db_path + ".part"
+    sqlite_files = [data for name, data in files if name.lower().endswith(SQLITE_EXTENSIONS)]
+    if sqlite_files:
+        with open(tmp_path, "wb") as f:
+            f.write(sqlite_files[0])
+    else:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        conn.set_authorizer(build_authorizer)
+        deadline = time.perf_counter() + SANDBOX_BUILD_TIMEOUT_SECONDS
+        conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, 10000)
+        try:
+            for name, data in files:
+                if name.lower().endswith(".sql"):
+                    conn.executescript(data.decode("utf-8"))
+            for name, data in files:
+                if name.lower().endswith(".csv"):
+                    load_csv_into_sqlite(conn, os.path.splitext(os.path.basename(name))[0], data)
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(
+                    f"Building the sandbox did not finish within {SANDBOX_BUILD_TIMEOUT_SECONDS} seconds."
+                ) from e
+            raise
+        finally:
+            conn.close()
+    os.replace(tmp_path, db_path)
+    return db_path
+
+
+def introspect_sandbox(db_path):
+    \"\"\"
+    Describes the tables and views of a sandbox database as schema index entries.
+
+    Returns:
+        list: One entry per table with its columns, types, foreign keys and row count.
+    \"\"\"
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        entries = []
+        objects = conn.execute(
+            "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        for name, object_type in objects:
+            columns = conn.execute(f"PRAGMA table_info({quote_identifier(name)})").fetchall()
+            references = [row[2] for row in conn.execute(f"PRAGMA foreign_key_list({quote_identifier(name)})")]
+            column_text = ", ".join(f"{column[1]} {column[2]}".strip() for column in columns)
+            rows = conn.execute(f"SELECT count(*) FROM {quote_identifier(name)}").fetchone()[0]
+            text = f"{object_type.upper()} {name}({column_text}) -- {rows} rows"
+            entries.append(schema_entry(name, [column[1] for column in columns], references, text))
+        return entries
+    finally:
+        conn.close()
+
+
+def sandbox_authorizer(action, arg1, arg2, db_name, trigger_name):
+    \"\"\"
+    SQLite authorizer for generated queries: denies everything that can reach the filesystem or change
+    connection settings.
+
+    ATTACH and DETACH are denied, which also covers VACUUM and VACUUM INTO (SQLite attaches the target
+    internally), as are PRAGMA writes and load_extension().
+    \"\"\"
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_PRAGMA and arg2 is not None and arg1.lower() not in SANDBOX_READ_PRAGMAS:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_FUNCTION and arg2 == "load_extension":
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def build_authorizer(action, arg1, arg2, db_name, trigger_name):
+    \"\"\"
+    SQLite authorizer for the uploaded DDL while the sandbox is built.
+
+    Applies sandbox_authorizer and denies anything outside the main database. PRAGMA writes are skipped
+    rather than denied, since dumps start with PRAGMA foreign_keys=OFF.
+    \"\"\"
+    if action == sqlite3.SQLITE_PRAGMA and arg2 is not None and arg1.lower() not in SANDBOX_READ_PRAGMAS:
+        return sqlite3.SQLITE_IGNORE
+    if db_name not in (None, "main"):
+        return sqlite3.SQLITE_DENY
+    return sandbox_authorizer(action, arg1, arg2, db_name, trigger_name)
+
+
+def run_sandbox_query(db_path, sql_query, row_limit=SANDBOX_ROW_LIMIT, timeout=SANDBOX_TIMEOUT_SECONDS):
+    \"\"\"
+    Runs a generated query against a private in-memory copy of the sandbox database.
+
+    The copy means INSERT/UPDATE/DELETE queries cannot change the sandbox, sandbox_authorizer stops
+    queries that would write files (ATTACH, VACUUM INTO) or change settings, a progress handler aborts
+    the query after timeout seconds, and at most row_limit rows are fetched.
+
+    Returns:
+        dict: columns, rows, truncated flag, query plan lines and elapsed seconds.
+    \"\"\"
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn = sqlite3.connect(":memory:")
+    try:
+        source.backup(conn)
+        conn.set_authorizer(sandbox_authorizer)
+        plan = []
+        try:
+            plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}").fetchall()]
+        except sqlite3.Error:
+            pass
+
+        deadline = time.perf_counter() + timeout
+        conn.set_progress_handler(lambda: 1 if time.perf_counter() > deadline else 0, 10000)
+        start = time.perf_counter()
+        try:
+            cursor = conn.execute(sql_query)
+            rows = cursor.fetchmany(row_limit + 1) if cursor.description else []
+        except sqlite3.OperationalError as e:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"The query did not finish within {timeout} seconds.") from e
+            raise
+        elapsed = time.perf_counter() - start
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+        return {
+            "columns": columns,
+            "rows": rows[:row_limit],
+            "truncated": len(rows) > row_limit,
+            "plan": plan,
+            "elapsed": elapsed,
+            "rowcount": cursor.rowcount,
+        }
+    finally:
+        conn.close()
+        source.close()
+
+
+def clean_identifier(name):
+    \"\"\"Strips quoting characters from a (possibly schema-qualified) identifier.\"\"\"
+    return re.sub(r'["`\\[\\]]', "", name)
+
+
+def schema_entry(name, columns, references, text):
+    \"\"\"
+    Builds one schema index entry.
+
+    Args:
+        name (str): Table or view name.
+        columns (list): Column names.
+        references (list): Names of tables this one references through foreign keys.
+        text (str): Compact description sent to the model.
+
+    Returns:
+        dict: The entry.
+    \"\"\"
+    return {"name": name, "columns": columns, "references": references, "text": text}
+
+
+def split_top_level(body):
+    \"\"\"Splits a CREATE TABLE body on commas that are not nested inside parentheses.\"\"\"
+    parts, depth, current = [], 0, []
+    for char in body:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def parse_ddl(text):
+    \"\"\"
+    Parses CREATE TABLE statements into schema index entries.
+
+    Args:
+        text (str): DDL, possibly mixed with other statements or prose.
+
+    Returns:
+        list: Schema entries, empty if the text contains no CREATE TABLE statement.
+    \"\"\"
+    entries = []
+    for match in CREATE_TABLE_RE.finditer(text):
+        depth, end = 1, match.end()
+        while end < len(text) and depth:
+            depth += {"(": 1, ")": -1}.get(text[end], 0)
+            end += 1
+        name = clean_identifier(match.group(1))
+        columns, references = [], []
+        for part in split_top_level(text[match.end():end - 1]):
+            words = part.split()
+            # Doubled or trailing commas leave empty parts
+            if not words:
+                continue
+            references += [clean_identifier(ref) for ref in REFERENCES_RE.findall(part)]
+            if not words[0].upper() in CONSTRAINT_KEYWORDS:
+                columns.append(clean_identifier(words[0]))
+        statement = " ".join(text[match.start():end].split())
+        entries.append(schema_entry(name, columns, references, statement))
+    return entries
+
+
+def format_schema(entries):
+    \"\"\"Joins schema entries into prompt context.\"\"\"
+    return "\\n".join(entry["text"] for entry in entries)
+
+
+def schema_hash(entries, extra_context=""):
+    \"\"\"Fingerprints a schema, plus any free-text context, so its index and answers can be cached and reused.\"\"\"
+    return hashlib.sha256((format_schema(entries) + "\\0" + extra_context).encode("utf-8")).hexdigest()
+
+
+def tokenize_schema_text(text):
+    \"\"\"Splits text and snake_case/camelCase identifiers into lowercase, roughly singular words.\"\"\"
+    words = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\\d+", text)
+    return [word.lower()[:-1] if len(word) > 3 and word.lower().endswith("s") else word.lower() for word in words]
+
+
+class SchemaIndex:
+    \"\"\"
+    Table-level index over a schema that returns only the tables relevant to a question.
+
+    Tables are ranked lexically (BM25 over table and column name words) and, when embeddings are
+    available, by embedding similarity; the two rankings are merged with reciprocal rank fusion.
+    \"\"\"
+
+    def __init__(self, entries, use_embeddings=True):
+        self.entries = entries
+        self.by_name = {entry["name"].lower(): entry for entry in entries}
+        # The table name is repeated so a match on it outweighs a match on one of many columns
+        self.documents = [
+            Counter(tokenize_schema_text(entry["name"]) * 2 + tokenize_schema_text(" ".join(entry["columns"])))
+            for entry in entries
+        ]
+        self.average_length = sum(sum(doc.values()) for doc in self.documents) / max(len(self.documents), 1)
+        document_frequency = Counter(word for doc in self.documents for word in doc)
+        self.idf = {
+            word: math.log(1 + (len(entries) - freq + 0.5) / (freq + 0.5))
+            for word, freq in document_frequency.items()
+        }
+        self.embeddings = None
+        if use_embeddings and len(entries) > SCHEMA_TOP_K:
+            try:
+                self.embeddings = embed_texts([entry["text"] for entry in entries], "retrieval_document")
+            except Exception:
+                self.embeddings = None
+
+    def lexical_scores(self, question):
+        \"\"\"BM25 score of every table for the question.\"\"\"
+        words = set(tokenize_schema_text(question))
+        scores = []
+        for doc in self.documents:
+            length = sum(doc.values())
+            score = 0.0
+            for word in words & doc.keys():
+                freq = doc[word]
+                score += self.idf[word] * freq * 2.2 / (freq + 1.2 * (0.25 + 0.75 * length / self.average_length))
+            scores.append(score)
+        return scores
+
+    def search(self, question, k=SCHEMA_TOP_K, query_embedding=None):
+        \"\"\"
+        Returns the k most relevant tables for a question, plus the tables they reference.
+
+        When nothing matches (no shared words and no embeddings), the whole schema is returned so the
+        model is not left without tables.
+
+        Args:
+            question (str): Natural language description of the query.
+            k (int): Number of tables to select by relevance.
+            query_embedding (numpy.ndarray): Normalized question embedding, if already computed.
+
+        Returns:
+            list: Selected schema entries.
+        \"\"\"
+        if len(self.entries) <= k:
+            return list(self.entries)
+
+        rankings = []
+        lexical = self.lexical_scores(question)
+        rankings.append([i for i in sorted(range(len(lexical)), key=lambda i: -lexical[i]) if lexical[i] > 0])
+        if self.embeddings is not None:
+            try:
+                query = query_embedding if query_embedding is not None else embed_texts([question], "retrieval_query")[0]
+                rankings.append(list(np.argsort(-(self.embeddings @ query))))
+            except Exception:
+                pass
+
+        fused = Counter()
+        for ranking in rankings:
+            for rank, i in enumerate(ranking):
+                fused[int(i)] += 1.0 / (RRF_K + rank)
+        if not fused:
+            return list(self.entries)
+        selected = [self.entries[i] for i, _ in fused.most_common(k)]
+
+        # Joins need the tables on the other side of each foreign key
+        names = {entry["name"].lower() for entry in selected}
+        for entry in list(selected):
+            for reference in entry["references"]:
+                target = self.by_name.get(reference.lower())
+                if target is not None and reference.lower() not in names and len(selected) < k + k // 2:
+                    selected.append(target)
+                    names.add(reference.lower())
+        return selected
+
+
+def embed_texts(texts, task_type):
+    \"\"\"
+    Embeds texts in batches and returns unit-length vectors.
+
+    Args:
+        texts (list): Texts to embed.
+        task_type (str): 'retrieval_document' for tables, 'retrieval_query' for questions.
+
+    Returns:
+        numpy.ndarray: One normalized row per text.
+    \"\"\"
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL, content=texts[start:start + EMBEDDING_BATCH_SIZE], task_type=task_type
+        )
+        vectors.extend(result["embedding"])
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def normalize_description(text):
+    \"\"\"Lowercases a request and drops punctuation and repeated whitespace so trivial rewordings share a key.\"\"\"
+    return " ".join(re.findall(r"\\w+", text.lower()))
+
+
+def cache_key(description, schema_fingerprint, dialect):
+    \"\"\"Exact-match key of a cached answer.\"\"\"
+    return hashlib.sha256(
+        "\\0".join([normalize_description(description), schema_fingerprint, dialect]).encode("utf-8")
+    ).hexdigest()
+
+
+class QueryCache:
+    \"\"\"
+    Persistent cache of generated queries, explanations and expected outputs.
+
+    Entries are keyed by normalized description, schema fingerprint and dialect, so a changed schema
+    never serves stale answers. Requests with no exact entry fall back to the closest question, by
+    embedding similarity, asked against the same schema and dialect. The least recently used entries
+    are evicted once the cache exceeds max_bytes.
+    \"\"\"
+
+    def __init__(self, path=QUERY_CACHE_PATH, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, schema_fingerprint TEXT, dialect TEXT, description TEXT, "
+                "embedding BLOB, sql_query TEXT, explanation TEXT, output TEXT, size INTEGER, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (schema_fingerprint, dialect)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    @contextmanager
+    def connect(self):
+        \"\"\"Opens a short-lived, committed-on-exit connection; SQLite serializes writers from concurrent sessions.\"\"\"
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, description, schema_fingerprint, dialect, embed=None):
+        \"\"\"
+        Finds a cached answer, trying the exact key before anything that needs an embedding.
+
+        Args:
+            description (str): The request as typed.
+            schema_fingerprint (str): Fingerprint of the schema the query targets.
+            dialect (str): SQL dialect.
+            embed (callable): Optional function returning the normalized embedding of the request (or None)
+                for near-duplicate lookup. It is only called when there is no exact entry.
+
+        Returns:
+            dict: The cached answer with a 'match' of 'exact' or 'similar', or None.
+        \"\"\"
+        columns = "key, description, sql_query, explanation, output"
+        with self.connect() as conn:
+            row = conn.execute(
+                f"SELECT {columns} FROM answers WHERE key = ?", (cache_key(description, schema_fingerprint, dialect),)
+            ).fetchone()
+            match = "exact"
+            embedding = embed() if row is None and embed is not None else None
+            if embedding is not None:
+                best, best_score = None, QUERY_CACHE_SIMILARITY
+                candidates = conn.execute(
+                    f"SELECT {columns}, embedding FROM answers "
+                    "WHERE schema_fingerprint = ? AND dialect = ? AND embedding IS NOT NULL",
+                    (schema_fingerprint, dialect)
+                )
+                numbers = re.findall(r"\\d+", description)
+                for candidate in candidates:
+                    # "top 5" and "top 10" embed almost identically but need different queries
+                    if re.findall(r"\\d+", candidate[1]) != numbers:
+                        continue
+                    score = float(np.frombuffer(candidate[-1], dtype=np.float32) @ embedding)
+                    if score >= best_score:
+                        best, best_score = candidate[:-1], score
+                row, match = best, "similar"
+            if row is None:
+                return None
+            conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), row[0]))
+        return {
+            "match": match, "description": row[1], "sql_query": row[2], "explanation": row[3], "output": row[4]
+        }
+
+    def store(self, description, schema_fingerprint, dialect, sql_query, explanation, output=None, embedding=None):
+        \"\"\"Saves an answer and evicts least recently used entries beyond the size cap.\"\"\"
+        blob = None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+        size = sum(len(value or "") for value in [description, sql_query, explanation, output]) + len(blob or b"")
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(description, schema_fingerprint, dialect), schema_fingerprint, dialect, description,
+                 blob, sql_query, explanation, output, size, time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            if total > self.max_bytes:
+                for key, entry_size in conn.execute("SELECT key, size FROM answers ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    total -= entry_size
+"""
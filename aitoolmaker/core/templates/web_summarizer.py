@@ -2,13 +2,71 @@
 Web Summarizer template for AIToolMaker.
 """
 
-WEB_SUMMARIZER_TEMPLATE = """import os
+WEB_SUMMARIZER_TEMPLATE = """import hashlib
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import requests
 import streamlit as st
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 import google.generativeai as genai
 from api_key import GEMINI_API_KEY
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+MODEL_NAME = "{{ model }}"
+
+# HTTP fetching
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 20
+TOTAL_TIMEOUT = int(os.environ.get("WEB_SUMMARIZER_FETCH_TIMEOUT", "60"))
+MAX_RESPONSE_BYTES = int(os.environ.get("WEB_SUMMARIZER_MAX_PAGE_MB", "10")) * 1024 ** 2
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+USER_AGENT = "Mozilla/5.0 (compatible; {{ tool_name }})"
+
+# Conditional GET cache of fetched pages
+HTTP_CACHE_DIR = ".http_cache"
+MAX_HTTP_CACHE_BYTES = int(os.environ.get("WEB_SUMMARIZER_HTTP_CACHE_MB", "200")) * 1024 ** 2
+
+# HTML parsing: selectolax when installed, else BeautifulSoup on lxml, else the pure-Python parser
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+PARSER_BACKEND = "selectolax" if LexborHTMLParser else HTML_PARSER
+STRIPPED_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "input", "button", "img", "nav", "footer", "aside"]
+BLOCK_TAGS = ["p", "pre", "li", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "td", "dd"]
+POSITIVE_HINTS = re.compile(r"article|body|content|entry|main|post|story|text", re.IGNORECASE)
+NEGATIVE_HINTS = re.compile(r"comment|footer|menu|nav|promo|related|share|sidebar|social|sponsor|widget|banner|cookie|breadcrumb", re.IGNORECASE)
+MIN_BLOCK_CHARS = 25
+MIN_CONTENT_CHARS = 250
+MAX_LINK_DENSITY = 0.5
+
+# Prompt size
+CHARS_PER_TOKEN = 4
+PROMPT_TOKEN_BUDGET = int(os.environ.get("WEB_SUMMARIZER_TOKEN_BUDGET", "30000"))
+LONG_PAGE_MODES = ["truncate", "parts"]
+PART_CONCURRENCY = 4
+
+# Summary cache keyed by canonical URL and extracted-text hash
+SUMMARY_CACHE_PATH = ".summary_cache.sqlite"
+SUMMARY_CACHE_TTL = int(os.environ.get("WEB_SUMMARIZER_CACHE_TTL_HOURS", "24")) * 3600
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
 def configure_gemini():
     \"\"\"Configures the Gemini API and returns the GenerativeModel.\"\"\"
     api_key = GEMINI_API_KEY 
@@ -24,63 +82,438 @@ def configure_gemini():
         return None
     
     genai.configure(api_key=api_key)
-    return genai.GenerativeModel('{{ model }}')
+    return genai.GenerativeModel(MODEL_NAME)
 
 model = configure_gemini()
 
+@st.cache_resource
+def get_http_session():
+    \"\"\"
+    Returns one pooled session shared by every session of this app, so repeat requests to a host
+    reuse its connections. Idempotent GETs are retried on connection errors and 502/503/504.
+    \"\"\"
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # urllib3 advertises br only when a Brotli decoder is installed
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING})
+    return session
+
+def http_cache_paths(url):
+    \"\"\"Metadata and body file paths of a cached page.\"\"\"
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(HTTP_CACHE_DIR, key + ".json"), os.path.join(HTTP_CACHE_DIR, key + ".body")
+
+def write_atomic(path, data):
+    \"\"\"
+    Writes bytes to a uniquely named temporary file first, so an interrupted write never looks complete
+    and concurrent fetches of the same page do not race on one temporary file.
+    \"\"\"
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def prune_http_cache():
+    \"\"\"Deletes the least recently used cached pages until the cache fits MAX_HTTP_CACHE_BYTES.\"\"\"
+    entries = []
+    for name in os.listdir(HTTP_CACHE_DIR):
+        if name.endswith(".json"):
+            meta_path = os.path.join(HTTP_CACHE_DIR, name)
+            body_path = meta_path[:-len(".json")] + ".body"
+            size = sum(os.path.getsize(path) for path in (meta_path, body_path) if os.path.exists(path))
+            entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+    total = sum(entry[1] for entry in entries)
+    for _, size, meta_path, body_path in sorted(entries):
+        if total <= MAX_HTTP_CACHE_BYTES:
+            break
+        for path in (meta_path, body_path):
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+
+def read_capped(response):
+    \"\"\"
+    Reads a streamed response body, decoded from gzip/deflate/br, and gives up on pages that are too
+    large or too slow. The cap applies to the decoded size, so compressed bombs are stopped too.
+
+    The deadline is enforced on the socket: before each read its timeout shrinks to the time left, so a
+    server trickling a few bytes at a time cannot hold the download past TOTAL_TIMEOUT.
+    \"\"\"
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > MAX_RESPONSE_BYTES:
+        raise ValueError(f"The page is larger than {MAX_RESPONSE_BYTES // 1024 ** 2} MB.")
+    deadline = time.monotonic() + TOTAL_TIMEOUT
+    raw = response.raw
+    # read1 (urllib3 2) returns after a single receive; read waits until the whole chunk has arrived
+    read = getattr(raw, "read1", None) or raw.read
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    body = bytearray()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout(f"The page took longer than {TOTAL_TIMEOUT} s to download.")
+        if sock is not None:
+            sock.settimeout(min(remaining, READ_TIMEOUT))
+        try:
+            chunk = read(DOWNLOAD_CHUNK_SIZE, decode_content=True)
+        except ReadTimeoutError as e:
+            if time.monotonic() >= deadline:
+                raise requests.Timeout(f"The page took longer than {TOTAL_TIMEOUT} s to download.") from e
+            raise requests.Timeout(f"The server sent nothing for {READ_TIMEOUT} s.") from e
+        except (DecodeError, ProtocolError) as e:
+            raise requests.ConnectionError(e) from e
+        if not chunk:
+            return bytes(body)
+        body.extend(chunk)
+        if len(body) > MAX_RESPONSE_BYTES:
+            raise ValueError(f"The page is larger than {MAX_RESPONSE_BYTES // 1024 ** 2} MB.")
+
+def fetch_page(url):
+    \"\"\"
+    Downloads a page, revalidating a cached copy with If-None-Match / If-Modified-Since when the
+    server gave an ETag or Last-Modified for it, so an unchanged page costs a 304 instead of a download.
+
+    Returns:
+        tuple: (body bytes, status) where status is 'downloaded' or 'not modified'.
+    \"\"\"
+    meta_path, body_path = http_cache_paths(url)
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(body_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    with get_http_session().get(
+        url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=True
+    ) as response:
+        if response.status_code == 304 and meta:
+            # The directory entry's mtime is the LRU clock
+            os.utime(meta_path)
+            with open(body_path, "rb") as f:
+                return f.read(), "not modified"
+        response.raise_for_status()
+        body = read_capped(response)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        no_store = "no-store" in response.headers.get("Cache-Control", "").lower()
+
+    if (etag or last_modified) and not no_store:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        write_atomic(body_path, body)
+        write_atomic(meta_path, json.dumps({"url": url, "etag": etag, "last_modified": last_modified}).encode("utf-8"))
+        prune_http_cache()
+    return body, "downloaded"
+
+def container_info(node, key, name, attributes):
+    \"\"\"(identity, hint) of a block's container; the hint is its tag, class and id for the name heuristics.\"\"\"
+    return key, " ".join([name or "", attributes.get("class") or "", attributes.get("id") or ""])
+
+def parse_with_selectolax(html):
+    \"\"\"Parses with selectolax (lexbor), the fastest backend. Returns (title, blocks, body text).\"\"\"
+    tree = LexborHTMLParser(html)
+    title_node = tree.css_first("title")
+    title = title_node.text(strip=True) if title_node else None
+    tree.strip_tags(STRIPPED_TAGS)
+    if tree.body is None:
+        return title, [], ""
+
+    block_selector = ",".join(BLOCK_TAGS)
+    blocks = []
+    for node in tree.body.css(block_selector):
+        # Only innermost blocks, so an <li> holding a <p> is not counted twice (css() matches the node itself too)
+        if len(node.css(block_selector)) > 1:
+            continue
+        text = " ".join(node.text(deep=True, separator=" ").split())
+        link_chars = sum(len(" ".join(link.text(deep=True, separator=" ").split())) for link in node.css("a"))
+        ancestors = []
+        parent = node.parent
+        while parent is not None and parent.tag != "html":
+            ancestors.append(container_info(parent, parent.mem_id, parent.tag, parent.attributes))
+            parent = parent.parent
+        blocks.append((text, link_chars, ancestors))
+    body_lines = tree.body.text(separator="\\n", strip=True).split("\\n")
+    return title, blocks, "\\n".join(line for line in body_lines if line)
+
+def parse_with_beautifulsoup(html):
+    \"\"\"Parses with BeautifulSoup on HTML_PARSER. Returns (title, blocks, body text).\"\"\"
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title = soup.title.get_text(strip=True) if soup.title else None
+    if soup.body is None:
+        return title, [], ""
+    for irrelevant in soup.body(STRIPPED_TAGS):
+        irrelevant.decompose()
+
+    blocks = []
+    for tag in soup.body.find_all(BLOCK_TAGS):
+        if tag.find(BLOCK_TAGS) is not None:
+            continue
+        text = tag.get_text(" ", strip=True)
+        link_chars = sum(len(link.get_text(" ", strip=True)) for link in tag.find_all("a"))
+        ancestors = []
+        for parent in tag.parents:
+            if parent.name in ("html", "[document]"):
+                break
+            attributes = {name: " ".join(value) if isinstance(value, list) else value for name, value in parent.attrs.items()}
+            ancestors.append(container_info(parent, id(parent), parent.name, attributes))
+        blocks.append((" ".join(text.split()), link_chars, ancestors))
+    return title, blocks, soup.body.get_text(separator="\\n", strip=True)
+
+def extract_main_content(blocks, body_text):
+    \"\"\"
+    Picks the page's main content, readability style.
+
+    Each paragraph-like block of some length scores its parent fully and its grandparent by half,
+    more for longer, comma-rich text. Containers named like content (article, main, post) get a bonus
+    and those named like boilerplate (nav, sidebar, comments) a penalty, and link-heavy containers are
+    discounted. The text of the best container is returned, or the whole body text when no container
+    holds enough of it.
+
+    Returns:
+        tuple: (text, True if a main-content container was found)
+    \"\"\"
+    scores, text_chars, link_chars = {}, {}, {}
+    for text, links, ancestors in blocks:
+        for key, _ in ancestors:
+            text_chars[key] = text_chars.get(key, 0) + len(text)
+            link_chars[key] = link_chars.get(key, 0) + links
+        if len(text) < MIN_BLOCK_CHARS:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        for (key, hint), share in zip(ancestors[:2], (1.0, 0.5)):
+            if key not in scores:
+                scores[key] = 25 * (bool(POSITIVE_HINTS.search(hint)) - bool(NEGATIVE_HINTS.search(hint)))
+            scores[key] += score * share
+
+    if scores:
+        best = max(scores, key=lambda key: scores[key] * (1 - link_chars[key] / max(text_chars[key], 1)))
+        content = [
+            text for text, links, ancestors in blocks
+            if any(key == best for key, _ in ancestors) and links <= MAX_LINK_DENSITY * max(len(text), 1)
+        ]
+        main_text = "\\n".join(content)
+        if len(main_text) >= MIN_CONTENT_CHARS:
+            return main_text, True
+    return body_text, False
+
+def estimate_tokens(text):
+    \"\"\"Estimates the token count of text without a network call (about four characters per token).\"\"\"
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_to_budget(text, max_tokens=PROMPT_TOKEN_BUDGET):
+    \"\"\"Splits text into parts of at most max_tokens tokens, breaking between lines where possible.\"\"\"
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    parts, current = [], ""
+    for line in text.split("\\n"):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:cut])
+            line = line[cut:].lstrip()
+        if current and len(current) + 1 + len(line) > max_chars:
+            parts.append(current)
+            current = line
+        else:
+            current = f"{current}\\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
 class Website:
     \"\"\"Represents a website and handles scraping its content.\"\"\"
     def __init__(self, url: str):
         self.url = url
         self.title = "No title found"
         self.text = ""
+        self.fetch_status = None
+        self.parse_seconds = 0.0
+        self.body_chars = 0
+        self.main_content = False
         self._scrape_website()
 
     def _scrape_website(self):
         \"\"\"Scrapes the website content, extracting title and main text.\"\"\"
         try:
-            response = requests.get(self.url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, "html.parser")
-            self.title = soup.title.string if soup.title else self.title
-            
-            for irrelevant in soup.body(["script", "style", "img", "input"]):
-                irrelevant.decompose()
-            
-            self.text = soup.body.get_text(separator="\\n", strip=True) if soup.body else self.text
-        except requests.RequestException as e:
+            content, self.fetch_status = fetch_page(self.url)
+            start = time.perf_counter()
+            parse = parse_with_selectolax if LexborHTMLParser else parse_with_beautifulsoup
+            title, blocks, body_text = parse(content)
+            self.title = title or self.title
+            self.text, self.main_content = extract_main_content(blocks, body_text)
+            self.body_chars = len(body_text)
+            self.parse_seconds = time.perf_counter() - start
+        except (requests.RequestException, ValueError) as e:
             st.error(f"Failed to retrieve the website: {e}")
             self.text = ""
         except Exception as e:
             st.error(f"An error occurred while parsing the website: {e}")
             self.text = ""
 
-def generate_user_prompt(website):
-    \"\"\"Generates the user prompt for the Gemini model.\"\"\"
-    if not website.text:
+def canonicalize_url(url):
+    \"\"\"
+    Normalizes a URL so trivially different spellings of the same page share a cache key: lowercase
+    scheme and host, no default port or fragment, tracking parameters dropped, remaining query
+    parameters sorted.
+    \"\"\"
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+class SummaryCache:
+    \"\"\"
+    Persistent cache of summaries keyed by canonical URL and a hash of the extracted text.
+
+    A page whose text changed gets a new key, so it is summarized again; entries older than ttl
+    seconds are ignored and removed on the next store.
+    \"\"\"
+    def __init__(self, path=SUMMARY_CACHE_PATH, ttl=SUMMARY_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "url TEXT, text_hash TEXT, model TEXT, title TEXT, summary TEXT, created REAL, "
+                "PRIMARY KEY (url, text_hash, model))"
+            )
+
+    @contextmanager
+    def connect(self):
+        \"\"\"Opens a short-lived, committed-on-exit connection; SQLite serializes writers from concurrent sessions.\"\"\"
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, url, text_hash, model_name):
+        \"\"\"Returns the cached (summary, created) for this page content, or None when missing or expired.\"\"\"
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT summary, created FROM summaries WHERE url = ? AND text_hash = ? AND model = ? AND created > ?",
+                (url, text_hash, model_name, time.time() - self.ttl)
+            ).fetchone()
+        return row
+
+    def store(self, url, text_hash, model_name, title, summary):
+        \"\"\"Saves a summary and drops expired entries.\"\"\"
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?)",
+                (url, text_hash, model_name, title, summary, now)
+            )
+            conn.execute("DELETE FROM summaries WHERE created <= ?", (now - self.ttl,))
+
+@st.cache_resource
+def get_summary_cache():
+    \"\"\"Returns the summary cache shared by every session of this app.\"\"\"
+    return SummaryCache()
+
+@st.cache_resource
+def get_cache_metrics():
+    \"\"\"Returns process-wide counters of summary cache hits and misses.\"\"\"
+    return {"lock": threading.Lock(), "hits": 0, "misses": 0}
+
+def record_cache_lookup(outcome):
+    metrics = get_cache_metrics()
+    with metrics["lock"]:
+        metrics[outcome] += 1
+
+def generate_user_prompt(website, text=None):
+    \"\"\"Generates the user prompt for the Gemini model, over text instead of the whole page when given.\"\"\"
+    text = website.text if text is None else text
+    if not text:
         return ""
     user_prompt = f"You are looking at this website titled: {website.title}\\n\\n"
     user_prompt += "The contents of this website are as follows. Please provide a short summary in markdown. "
     user_prompt += "If it includes news or announcements, summarize these too.\\n\\n"
-    user_prompt += f"{website.text}"
+    user_prompt += f"{text}"
     return user_prompt
 
-def summarize_website(url):
-    \"\"\"Summarizes the content of a given URL using the Gemini model.\"\"\"
+def generate_part_prompt(website, part, index, total):
+    \"\"\"Generates the prompt that condenses one part of a page too long for a single prompt.\"\"\"
+    return (
+        f"This is part {index + 1} of {total} of the website titled: {website.title}\\n\\n"
+        "List its key points, facts and announcements as short markdown bullets.\\n\\n"
+        f"{part}"
+    )
+
+def summarize_website(url, long_page_mode="truncate"):
+    \"\"\"
+    Summarizes the content of a given URL using the Gemini model.
+
+    Pages longer than PROMPT_TOKEN_BUDGET are either cut at the budget ('truncate') or condensed
+    part by part, concurrently, before the final summary ('parts').
+    \"\"\"
     if not model:
         return "Gemini API is not configured. Cannot summarize.", None
     
     website = Website(url)
     if not website.text:
         return "Could not retrieve website content to summarize.", None
+    if website.fetch_status == "not modified":
+        st.caption("The page has not changed since it was last fetched (HTTP 304), so the cached copy was used.")
+
+    parts = split_to_budget(website.text)
+    if len(parts) > 1 and long_page_mode == "truncate":
+        parts = parts[:1]
+    st.caption(
+        f"Parsed with {PARSER_BACKEND} in {website.parse_seconds * 1000:.0f} ms | "
+        f"{'main content' if website.main_content else 'full page'}: {len(website.text):,} of {website.body_chars:,} characters | "
+        f"prompt ~{sum(estimate_tokens(part) for part in parts):,} tokens"
+        + (f" in {len(parts)} parts" if len(parts) > 1 else "")
+        + (" (truncated)" if len(parts) == 1 and len(parts[0]) < len(website.text) else "")
+    )
 
-    user_prompt = generate_user_prompt(website)
+    user_prompt = generate_user_prompt(website, parts[0] if len(parts) == 1 else None)
     if not user_prompt:
         return "No content to summarize.", None
+
+    cache = get_summary_cache()
+    cache_url = canonicalize_url(url)
+    text_hash = hashlib.sha256(f"{long_page_mode}\\n{website.title}\\n{website.text}".encode("utf-8")).hexdigest()
+    cached = cache.lookup(cache_url, text_hash, MODEL_NAME)
+    if cached:
+        record_cache_lookup("hits")
+        st.caption(f"Page content unchanged: summary reused from {(time.time() - cached[1]) / 60:.0f} min ago.")
+        return cached[0], website.title
+    record_cache_lookup("misses")
         
     try:
         with st.spinner("Generating summary..."):
+            if len(parts) > 1:
+                with ThreadPoolExecutor(max_workers=min(PART_CONCURRENCY, len(parts))) as executor:
+                    notes = list(executor.map(
+                        lambda args: model.generate_content(generate_part_prompt(website, *args)).text,
+                        [(part, index, len(parts)) for index, part in enumerate(parts)]
+                    ))
+                user_prompt = generate_user_prompt(website, "\\n\\n".join(notes))
             response = model.generate_content(user_prompt)
+        cache.store(cache_url, text_hash, MODEL_NAME, website.title, response.text)
         return response.text, website.title
     except Exception as e:
         st.error(f"An error occurred while generating the summary: {e}")
@@ -93,6 +526,20 @@ st.markdown(\"\"\"Enter a website URL below, and I'll provide a concise summary
 
 url = st.text_input("Enter website URL", placeholder="e.g., https://www.example.com")
 
+with st.sidebar:
+    long_page_mode = st.radio(
+        "Long pages",
+        LONG_PAGE_MODES,
+        format_func={"truncate": "Truncate to the token budget", "parts": "Summarize in parts"}.get,
+        help=f"Pages over ~{PROMPT_TOKEN_BUDGET:,} tokens of main content."
+    )
+    with st.expander("Cache Metrics"):
+        metrics = get_cache_metrics()
+        lookups = metrics["hits"] + metrics["misses"]
+        st.metric("Hits", metrics["hits"])
+        st.metric("Misses", metrics["misses"])
+        st.metric("Hit rate", f"{metrics['hits'] / lookups:.0%}" if lookups else "-")
+
 if 'summary_text' not in st.session_state:
     st.session_state.summary_text = None
 if 'website_title' not in st.session_state:
@@ -105,7 +552,7 @@ if st.button("Summarize"):
             st.session_state.summary_text = None
             st.session_state.website_title = None
         else:
-            summary, title = summarize_website(url)
+            summary, title = summarize_website(url, long_page_mode)
             st.session_state.summary_text = summary
             st.session_state.website_title = title if title else "summary"
     else:
@@ -30,7 +30,7 @@ setup(
     ],
     python_requires='>=3.8',
     install_requires=[
-        'streamlit>=1.28.0',
+        'streamlit>=1.37.0',
         'google-generativeai>=0.3.0',
         'jinja2>=3.0.0',
         'pandas>=2.0.0',
@@ -42,6 +42,12 @@ setup(
         'faiss-cpu>=1.7.4',
         'requests>=2.31.0',
         'beautifulsoup4>=4.12.0',
+        'brotli>=1.1.0',
+        'lxml>=4.9.0',
+        'duckdb>=1.1.0',
+        'pyarrow>=12.0.0',
+        'numpy>=1.24.0',
+        'scipy>=1.10.0',
     ],
     extras_require={
         'dev': [